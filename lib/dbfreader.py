@@ -0,0 +1,219 @@
+"""
+    kartograph - a svg mapping library
+    Copyright (C) 2011  Gregor Aisch
+
+    This program is free software: you can redistribute it and/or modify
+    it under the terms of the GNU Affero General Public License as
+    published by the Free Software Foundation, either version 3 of the
+    License, or (at your option) any later version.
+
+    This program is distributed in the hope that it will be useful,
+    but WITHOUT ANY WARRANTY; without even the implied warranty of
+    MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+    GNU Affero General Public License for more details.
+
+    You should have received a copy of the GNU Affero General Public License
+    along with this program.  If not, see <http://www.gnu.org/licenses/>.
+"""
+
+"""
+column-wise DBF reading
+
+The records of a shapefile are returned as ColumnRecords, which decode a
+column for all records the first time one of its values is accessed.
+Columns that are never looked at are never decoded. Values are decoded
+the same way as by the shapefile library, but deleted records are kept
+so that record i always belongs to shape i.
+
+Record filters (see options.parse_layer_filter) are evaluated on the
+filtered column only, via select().
+"""
+
+import struct
+
+
+def decode_number(value, deci):
+	value = value.replace('\0', '').strip()
+	value = value.replace('*', '') # QGIS NULL is all '*' chars
+	if value == '':
+		return None
+	if deci:
+		try:
+			return float(value)
+		except ValueError:
+			return None
+	try:
+		return int(value)
+	except ValueError:
+		try:
+			return int(float(value))
+		except ValueError:
+			return None
+
+
+def decode_date(value):
+	from datetime import date
+	if value.count('0') == len(value): # QGIS NULL is all '0' chars
+		return None
+	try:
+		return date(int(value[:4]), int(value[4:6]), int(value[6:8]))
+	except:
+		return value.strip()
+
+
+def decode_logical(value):
+	if value == ' ':
+		return None # missing or not yet set
+	if value in 'YyTt1':
+		return True
+	if value in 'NnFf0':
+		return False
+	return None
+
+
+def decoder(typ, deci):
+	"""
+	returns a function that decodes the raw values of a field type
+	"""
+	if typ in ('N', 'F'):
+		return lambda value: decode_number(value, deci)
+	if typ == 'D':
+		return decode_date
+	if typ == 'L':
+		return decode_logical
+	return lambda value: value.strip()
+
+
+class DBFReader(object):
+	"""
+	memory-mapped reader over a .dbf file that decodes single columns
+	"""
+	def __init__(self, path):
+		import numpy as np
+		self.path = path
+		self.data = np.memmap(path, dtype=np.uint8, mode='r')
+		self.numRecords, header_length, record_length = struct.unpack('<xxxxLHH20x', self.data[:32].tostring())
+		self.fields = [('DeletionFlag', 'C', 1, 0)]
+		self.offsets = []
+		offset = 1 # skip the deletion flag
+		for i in range((header_length - 33) // 32):
+			desc = list(struct.unpack('<11sc4xBB14x', self.data[32*(i+1):32*(i+2)].tostring()))
+			name = desc[0]
+			if '\0' in name:
+				name = name[:name.index('\0')]
+			else:
+				name = name[:-1]
+			desc[0] = name.lstrip()
+			self.fields.append(desc)
+			self.offsets.append(offset)
+			offset += desc[2]
+		end = header_length + self.numRecords * record_length
+		self.rows = self.data[header_length:end].reshape((self.numRecords, record_length))
+
+	def column(self, c):
+		"""
+		decodes and returns all values of column c
+		"""
+		name, typ, size, deci = self.fields[c+1]
+		offset = self.offsets[c]
+		raw = self.rows[:,offset:offset+size].tostring()
+		return map(decoder(typ, deci), [raw[i:i+size] for i in xrange(0, len(raw), size)])
+
+	def records(self):
+		return ColumnRecords(self.numRecords, len(self.fields) - 1, self.column)
+
+
+class ColumnRecords(object):
+	"""
+	the records of a shapefile, decoded column by column on first access.
+	record i is returned as Record, which can be indexed like a list
+	"""
+	def __init__(self, num_records, num_columns, load_column):
+		self.num_records = num_records
+		self.columns = [None] * num_columns
+		self.load_column = load_column
+
+	def column(self, c):
+		if self.columns[c] is None:
+			self.columns[c] = self.load_column(c)
+		return self.columns[c]
+
+	def load(self):
+		"""
+		decodes all columns that haven't been accessed yet
+		"""
+		for c in range(len(self.columns)):
+			self.column(c)
+
+	def __len__(self):
+		return self.num_records
+
+	def __getitem__(self, i):
+		if i < 0: i += self.num_records
+		if i < 0 or i >= self.num_records:
+			raise IndexError('record index out of range')
+		return Record(self, i)
+
+	def __iter__(self):
+		for i in xrange(self.num_records):
+			yield Record(self, i)
+
+
+class Record(object):
+	"""
+	a single record of ColumnRecords
+	"""
+	__slots__ = ('records', 'index')
+
+	def __init__(self, records, index):
+		self.records = records
+		self.index = index
+
+	def __getitem__(self, c):
+		if isinstance(c, slice):
+			return [self[i] for i in range(*c.indices(len(self)))]
+		return self.records.column(c)[self.index]
+
+	def __setitem__(self, c, value):
+		self.records.column(c)[self.index] = value
+
+	def __len__(self):
+		return len(self.records.columns)
+
+	def __iter__(self):
+		for c in range(len(self)):
+			yield self[c]
+
+	def __repr__(self):
+		return repr(list(self))
+
+
+def select(reader, filter):
+	"""
+	returns the indices of the records of a reader that pass a filter,
+	given as dict with the keys attribute, type (include or exclude) and
+	one of equals (list of values), greater-than or less-than
+	"""
+	import errors
+	fields = [f[0] for f in reader.fields[1:]]
+	if filter['attribute'] not in fields:
+		raise errors.ShapefileAttributesError('could not find an attribute named "'+filter['attribute']+'" in shapefile '+reader.path+'\n\navailable attributes are:\n'+' '.join(fields))
+	values = reader.column(fields.index(filter['attribute']))
+
+	def number(value):
+		try:
+			return float(value)
+		except (TypeError, ValueError):
+			return None
+
+	if 'equals' in filter:
+		accepted = set([str(v) for v in filter['equals']])
+		match = lambda value: str(value) in accepted
+	elif 'greater-than' in filter:
+		limit = filter['greater-than']
+		match = lambda value: number(value) is not None and number(value) > limit
+	else:
+		limit = filter['less-than']
+		match = lambda value: number(value) is not None and number(value) < limit
+	include = filter.get('type', 'include') != 'exclude'
+	return [i for i in range(len(values)) if match(values[i]) == include]
@@ -8,4 +8,14 @@ class OptionParseError(Exception):
 
 
 class ShapefileAttributesError(Exception):
-	pass
\ No newline at end of file
+	pass
+
+
+class RenderRequestError(Exception):
+	"""invalid request to the render server"""
+	pass
+
+
+class UnknownTargetError(RenderRequestError):
+	"""requested country or region does not exist"""
+	pass
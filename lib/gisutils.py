@@ -23,37 +23,61 @@ A collection of functions useful for gis-related tasks
 
 
 def area(pts, earthrad=6371):
-	from math import radians as rad, sin, cos, asin, sqrt, pi, tan, atan
-	pihalf = pi * .5
+	"""
+	computes the spherical area of a polygon given as list of [lng,lat]
+	pairs in degrees
+	"""
+	return part_areas(pts, [0], earthrad)[0]
+	
 
+def part_areas(points, parts, earthrad=6371):
+	"""
+	computes the spherical areas of all parts of a shape in one pass.
+	parts are the start indices of the parts in points, so the points
+	of a whole layer may be passed at once, too
+	"""
+	import numpy as np
+	pihalf = np.pi * .5
+	
+	pts = np.asarray(points, dtype=np.float64).reshape((-1, 2))
 	n = len(pts)
-	sum = 0
-	for j in range(0,n):
-		k = (j+1)%n
-		if j == 0:
-			lam1 = rad(pts[j][0])
-			beta1 = rad(pts[j][1])
-			cosB1 = cos(beta1)
+	starts = list(parts)
+	ends = starts[1:] + [n]
+	
+	# index of the next point of each edge, the last point of
+	# a part is connected to its first point
+	k = np.arange(1, n+1)
+	for i in range(len(starts)):
+		if ends[i] > starts[i]:
+			k[ends[i]-1] = starts[i]
+	k = k[:n]
+	
+	lam1 = np.radians(pts[:,0])
+	beta1 = np.radians(pts[:,1])
+	cosB1 = np.cos(beta1)
+	lam2 = lam1[k]
+	beta2 = beta1[k]
+	cosB2 = cosB1[k]
+	
+	hav = (1.0 - np.cos(beta2 - beta1)) / 2.0 + cosB1 * cosB2 * ((1.0 - np.cos(lam2 - lam1)) / 2.0)
+	a = 2 * np.arcsin(np.sqrt(hav))
+	b = pihalf - beta2
+	c = pihalf - beta1
+	s = 0.5 * (a+b+c)
+	t = np.tan(s*0.5) * np.tan((s-a)*0.5) * np.tan((s-b)*0.5) * np.tan((s-c)*0.5)
+	excess = np.abs(4*np.arctan(np.sqrt(np.abs(t))))
+	excess = np.where(lam2 < lam1, -excess, excess)
+	excess[lam1 == lam2] = 0
+	
+	# the excess is summed up edge by edge (rather than pairwise as
+	# by np.sum) to get exactly the same areas as before
+	areas = []
+	for i in range(len(starts)):
+		if ends[i] > starts[i]:
+			areas.append(abs(float(np.cumsum(excess[starts[i]:ends[i]])[-1]))*earthrad*earthrad)
 		else:
-			lam1 = lam2
-			beta1 = beta2
-			cosB1 = cosB2
-		lam2 = rad(pts[k][0])
-		beta2 = rad(pts[k][1])
-		cosB2 = cos(beta2)
-		
-		if lam1 != lam2:
-			hav = haversine( beta2 - beta1 ) + cosB1 * cosB2 * haversine(lam2 - lam1)
-			a = 2 * asin(sqrt(hav))
-			b = pihalf - beta2
-			c = pihalf - beta1
-			s = 0.5 * (a+b+c)
-			t = tan(s*0.5) * tan((s-a)*0.5) * tan((s-b)*0.5) * tan((s-c)*0.5)
-			excess = abs(4*atan(sqrt(abs(t))))
-			if lam2 < lam1:
-				excess = -excess
-			sum += excess
-	return abs(sum)*earthrad*earthrad
+			areas.append(0)
+	return areas
 			
 	
 def haversine(x):
@@ -72,12 +96,9 @@ def shape_area(shape):
 	"""
 	computes the area of a shapefile shape
 	"""
-	parts = shape.parts[:]
-	parts.append(len(shape.points))
 	A = 0
-	for i in range(len(parts)-1):
-		pts = shape.points[parts[i]:parts[i+1]]
-		A += area(pts)
+	for a in part_areas(shape.points, shape.parts):
+		A += a
 	return A
 	
 
@@ -105,7 +126,8 @@ def shape_center(shape):
 	
 	poly = Polygon()
 	for i in range(len(parts)-1):
-		pts = shape.points[parts[i]:parts[i+1]]
+		# copy points, shape.points may be a read-only view
+		pts = [[lon, lat] for (lon, lat) in shape.points[parts[i]:parts[i+1]]]
 		if far_east and far_west:
 			# correct points
 			for j in range(len(pts)):
@@ -119,10 +141,7 @@ def polygon_center(polygon):
 	computes the center of gravity of a gisutils.Polygon
 	"""
 	from Polygon import Polygon as Poly
-	pts = []
-	for pt in polygon.points:
-		pts.append((pt.x, pt.y))
-	poly = Poly(pts)
+	poly = Poly(polygon.coords.tolist())
 	c = poly.center()
 	return Point(c[0], c[1])
 	
@@ -133,74 +152,39 @@ import sys
 
 
 		
-def unify(polygons):
+def unify(polygons, precision=6):
 	"""
-	Replaces duplicate points with an instance of the 
-	same point
+	Replaces duplicate points with a reference to the 
+	same vertex in a flag store shared by all polygons
+	
+	points are considered equal if their coordinates match
+	after rounding to the given number of decimals
 	"""
-	point_store = {}
-	out_polygons = []
-	kept = 0
-	removed = 0
+	import numpy as np
+	if sum([len(poly.coords) for poly in polygons]) == 0:
+		return
+	coords = np.concatenate([poly.coords for poly in polygons])
+	flags = np.concatenate([np.frombuffer(poly.flags, dtype=np.uint8)[poly.vidx] for poly in polygons])
+	
+	# quantize to integers and find duplicates by sorting
+	keys = np.round(coords * 10**precision).astype(np.int64)
+	keys, first, inverse = np.unique(keys, axis=0, return_index=True, return_inverse=True)
+	
+	# the first occurrence of a point keeps its flags
+	store = bytearray(flags[first].tobytes())
+	
+	# duplicate points share the coordinates of the first occurrence
+	coords = coords[first]
+	offset = 0
 	for poly in polygons:
-		new_points = []
-		for pt in poly.points:
-			pid = '%f-%f' % (pt.x, pt.y)
-			if pid in point_store:
-				point = point_store[pid]
-				if point.two: point.three = True
-				else: point.two = True
-				removed += 1
-			else:
-				point = pt
-				kept += 1
-				point_store[pid] = pt
-			new_points.append(point)
-		poly.points = new_points
-	#print 'unifying polygons removed %d duplicate points (of %d total points)'%(removed, removed+kept)			
+		n = len(poly.coords)
+		poly.vidx = inverse[offset:offset+n]
+		poly.coords = coords[poly.vidx]
+		poly.flags = store
+		offset += n
+	#print 'unifying polygons removed %d duplicate points (of %d total points)'%(len(inverse)-len(first), len(inverse))			
 		
 		
-def simplify(polygon, dist):
-	"""
-	Simplifies a list of polygons while maintaining
-	the correct borders between each polygon
-	"""
-	new_points = []
-	dist_sq = dist*dist
-	n = len(polygon.points)
-	
-	kept = 0
-	deleted = 0
-	
-	
-	for i in range(0, n):
-		# look for the first "inner" points and mark them as not deletable
-		j = (i+1)%n
-		pt = polygon.points[i]
-		npt = polygon.points[j]
-		if pt.two and not npt.two:
-			pt.keep = True
-		if not pt.two and npt.two:
-			npt.keep = True
-	
-	for i in range(0, n):
-		pt = polygon.points[i]
-		if i == 0 or i == n-1:
-			pt.simplified = True
-			lpt = pt
-		else:
-			d = (pt.x - lpt.x) * (pt.x - lpt.x) + (pt.y - lpt.y) * (pt.y - lpt.y)
-			if d > dist_sq or not pt.isDeletable():
-				lpt = pt
-				kept += 1
-			else:
-				pt.deleted = True
-				deleted += 1
-			pt.simplified = True
-	
-	
-
-
 class Point(object):
 	"""
 	Point used
@@ -208,16 +192,6 @@ class Point(object):
 	def __init__(self, x, y):
 		self.x = x
 		self.y = y
-		self.simplified = False
-		self.deleted = False
-		self.two = False
-		self.three = False
-		self.keep = False
-		
-	def isDeletable(self):
-		if self.keep or self.simplified or self.three: 
-			return False
-		return True
 		
 	def __str__(self):
 		return '%f,%f' % (self.x, self.y)
@@ -241,11 +215,7 @@ def smartBounds(shape, proj, thresh=0.25):
 	parts.append(len(points))
 	
 	# find largest polygon
-	areas = []
-	for j in range(0,len(parts)-1):
-		pts = points[parts[j]:parts[j+1]]
-		a = area(pts)
-		areas.append(a)
+	areas = part_areas(points, shape.parts)
 	max_area = max(areas)
 	
 	# filter polygons
@@ -333,6 +303,9 @@ class Bounds2D(object):
 		self.update(Point(bbox.right, bbox.bottom))
 
 	
+# simplification state of polygon vertices, stored as bits
+DELETED = 2
+
 class Polygon(object):
 	"""
 	A polygon, identified by an unique id
@@ -343,28 +316,55 @@ class Polygon(object):
 	- 'object' for access via x = point['x'], y = point['y']
 	- 'class'  for access via x = point.x, y = point.y
 	- 'point'  for access via point.x
+	- 'arrays' for a tuple of numpy arrays (xs, ys)
+	
+	the coordinates are stored in a contiguous (n,2) float array. the
+	simplification state of each vertex is kept as bit flags in the byte
+	array flags, vidx maps the vertices to their position in flags.
+	after unify() the flags are shared by all unified polygons
 	"""
 	def __init__(self, id, points, mode='tuple', data=None, closed=True, isHole=False):
+		import numpy as np
 		self.id = id
 		self.closed = closed
 		self.isHole = isHole
 		self.bbox = Bounds2D()
 		if data != None: self.data = data
 		else: self.data = {}
-		new_points = []
-		for pt in points:
+		if mode == 'arrays':
+			xs, ys = points
+			coords = np.empty((len(xs), 2), dtype=np.float64)
+			coords[:,0] = xs
+			coords[:,1] = ys
+		else:
 			if mode == 'tuple':
-				pt = Point(pt[0],pt[1])
+				pts = [(pt[0], pt[1]) for pt in points]
 			elif mode == 'object':
-				pt = Point(pt['x'],pt['y'])
-			elif mode == 'class':
-				pt = Point(pt.x,pt.y)
-			elif mode == 'point':
-				pass
-			
-			self.bbox.update(pt)
-			new_points.append(pt)
-		self.points = new_points
+				pts = [(pt['x'], pt['y']) for pt in points]
+			else:
+				pts = [(pt.x, pt.y) for pt in points]
+			coords = np.array(pts, dtype=np.float64).reshape((len(pts), 2))
+		if len(coords) > 0:
+			self.bbox.update((float(coords[:,0].min()), float(coords[:,1].min())))
+			self.bbox.update((float(coords[:,0].max()), float(coords[:,1].max())))
+		self.coords = coords
+		self.flags = bytearray(len(coords))
+		self.vidx = np.arange(len(coords))
+		
+	
+	def vertex_flags(self):
+		"""
+		returns the flags of all vertices as uint8 array
+		"""
+		import numpy as np
+		return np.frombuffer(self.flags, dtype=np.uint8)[self.vidx]
+		
+	
+	def visible_coords(self):
+		"""
+		returns the coordinates of all vertices that are not deleted
+		"""
+		return self.coords[self.vertex_flags() & DELETED == 0]
 		
 		
 	def svgPolygonPoints(self, useIntegers=True):
@@ -372,45 +372,44 @@ class Polygon(object):
 		returns the points in SVG <polygon points="..." />
 		"""
 		svg_poly_points = ''
-		for pt in self.points:
-			if pt.deleted: continue
+		for x, y in self.visible_coords().tolist():
 			if useIntegers:
-				svg_poly_points += '%d,%d '%(int(pt.x),int(pt.y))
+				svg_poly_points += '%d,%d '%(int(x),int(y))
 			else:
-				svg_poly_points += '%f,%f '%(pt.x,pt.y)	
+				svg_poly_points += '%f,%f '%(x,y)	
 		return svg_poly_points
 		
 	
-	def svgPathString(self, useInt=True):
+	def path_coords(self):
+		"""
+		returns the coordinates of the path of this polygon, that is all
+		vertices that are not deleted plus the first one again for
+		closed polygons
+		"""
+		import numpy as np
+		flags = self.vertex_flags()
+		pts = self.coords[flags & DELETED == 0]
+		if self.closed and len(pts) > 0 and not flags[0] & DELETED:
+			pts = np.concatenate((pts, pts[:1]))
+		return pts
+		
+	
+	def svgPathString(self, useInt=True, relative=False):
 		"""
 		returns the path string representation of this polygon
 		"""
-		ps = ''
-		pts = self.points[:]
-		if self.closed:
-			pts.append(pts[0])
-		for pt in pts:
-			if pt.deleted: continue #ignore deleted points
-			if ps == '': ps = 'M'
-			else: ps += 'L'
-			if useInt:
-				ps += '%d,%d' % (round(pt.x), round(pt.y))
-			else:
-				ps += '%.3f,%.3f' % (pt.x, pt.y)
-		if self.closed: 
-			ps += 'Z' # close path
-		return ps
+		return svg_path_string([self], useInt, relative)
 		
 	def __str__(self):
-		return '<Polygon ('+str(len(self.points))+' points)>'
+		return '<Polygon ('+str(len(self.coords))+' points)>'
 		
 	def area(self):
 		a = 0
-		pts = self.points
+		pts = self.coords.tolist()
 		for i in range(len(pts)-1):
-			p0 = pts[i]
-			p1 = pts[i+1]
-			a += p0.x*p1.y - p1.x*p0.y
+			x0, y0 = pts[i]
+			x1, y1 = pts[i+1]
+			a += x0*y1 - x1*y0
 		return abs(a)*.5
 		
 		
@@ -427,30 +426,118 @@ class MPolygon:
 		return '<M;Polygon ('+str(len(self.points))+' points)>'
 
 
-	def svgPathString(self, useInt=True):
+	def svgPathString(self, useInt=True, relative=False):
 		"""
 		returns the path string representation of this polygon
 		"""
-		ps = ''
-		pts = self.points[:]
-		if self.closed:
-			pts.append(pts[0])
-		for pt in pts:
-			if pt.deleted: continue #ignore deleted points
-			if ps == '': ps = 'M'
-			else: ps += 'L'
-			if useInt:
-				ps += '%d,%d' % (round(pt.x), round(pt.y))
-			else:
-				ps += '%.3f,%.3f' % (pt.x, pt.y)
-		if self.closed: 
-			ps += 'Z' # close path
-		return ps
+		import numpy as np
+		contours = []
+		for i in range(len(self.poly)):
+			pts = np.array(self.poly.contour(i), dtype=np.float64).reshape((-1, 2))
+			contours.append(np.concatenate((pts, pts[:1])))
+		return encode_path(contours, [True] * len(contours), useInt, relative)
 		
 
 	def area(self):
 		return self.poly.area()
 	
+def svg_path_string(polygons, useInt=True, relative=False):
+	"""
+	returns the path string of a list of polygons, e.g. of all polygons
+	of a country, which are drawn as one <path>
+	"""
+	return encode_path([poly.path_coords() for poly in polygons], [poly.closed for poly in polygons], useInt, relative)
+
+
+def encode_path(contours, closed, useInt=True, relative=False):
+	"""
+	encodes a list of (n,2) coordinate arrays as svg path string. a
+	template of the entire path is built first, so that all coordinates
+	are formatted in one go. see encode_relative_path for relative mode
+	"""
+	import numpy as np
+	if relative:
+		return encode_relative_path(contours, closed, useInt)
+	fmt = ('%.3f,%.3f', '%d,%d')[useInt]
+	templates = []
+	for i in range(len(contours)):
+		n = len(contours[i])
+		t = 'L'.join([fmt] * n)
+		if n > 0: t = 'M' + t
+		if closed[i]: t += 'Z' # close path
+		templates.append(t)
+	template = ' '.join(templates)
+	if len(contours) == 0:
+		return template
+	coords = np.concatenate(contours)
+	if useInt:
+		coords = quantize(coords, 1)
+	return template % tuple(coords.ravel().tolist())
+
+
+def quantize(coords, scale):
+	"""
+	returns coords * scale rounded half away from zero (like round())
+	as integer array
+	"""
+	import numpy as np
+	a = np.abs(coords * scale)
+	r = np.floor(a)
+	r += (a - r) >= 0.5
+	return (np.sign(coords) * r).astype(np.int64)
+
+
+def format_fixed(value):
+	"""
+	formats a coordinate given in thousandths as short decimal, e.g.
+	-500 as -.5 and 12000 as 12
+	"""
+	s = ('%.3f' % (value / 1000.)).rstrip('0').rstrip('.')
+	if s.startswith('0.'): return s[1:]
+	if s.startswith('-0.'): return '-' + s[2:]
+	if s == '-0': return '0'
+	return s
+
+
+def encode_relative_path(contours, closed, useInt=True):
+	"""
+	encodes a list of (n,2) coordinate arrays as compact svg path string.
+	every contour starts with an absolute moveto, followed by relative
+	lineto commands with implicit repetition (M x,y l dx,dy dx,dy z).
+	the coordinates are quantized to integers or thousandths before the
+	deltas are computed, so rounding errors do not add up, and points
+	that fall onto the previous point are dropped
+	"""
+	import numpy as np
+	scale = (1000, 1)[useInt]
+	templates = []
+	values = []
+	for i in range(len(contours)):
+		if len(contours[i]) == 0:
+			if closed[i]: templates.append('Z')
+			continue
+		q = quantize(contours[i], scale)
+		keep = np.ones(len(q), dtype=bool)
+		keep[1:] = np.any(q[1:] != q[:-1], axis=1)
+		q = q[keep]
+		if closed[i] and len(q) > 1 and (q[-1] == q[0]).all():
+			q = q[:-1] # z returns to the first point
+		d = np.diff(q, axis=0)
+		t = 'M%s,%s'
+		if len(d) > 0: t += 'l' + ' '.join(['%s,%s'] * len(d))
+		if closed[i]: t += 'z'
+		templates.append(t)
+		values.append(q[:1])
+		values.append(d)
+	template = ' '.join(templates)
+	if len(values) == 0:
+		return template
+	values = np.concatenate(values).ravel().tolist()
+	if not useInt:
+		values = map(format_fixed, values)
+	return template % tuple(values)
+
+
 class View(object):
 	"""
 	translates a point to a view
@@ -476,6 +563,16 @@ class View(object):
 		x = (px - bbox.left) * s + (w - bbox.width * s) * .5
 		y = (py - bbox.top) * s + (h - bbox.height * s) * .5
 		return ((x,y), Point(x, y))[isinstance(pt, Point)]
+	
+	def project_array(self, xs, ys):
+		"""
+		translates arrays of projected coordinates to the view
+		"""
+		s = self.scale
+		bbox = self.bbox
+		cx = (self.width - bbox.width * s) * .5
+		cy = (self.height - bbox.height * s) * .5
+		return ((xs - bbox.left) * s + cx, (ys - bbox.top) * s + cy)
 		
 	def __str__(self):
 		return 'View(w=%f, h=%f, pad=%f, scale=%f, bbox=%s)' % (self.width, self.height, self.padding, self.scale, self.bbox)
@@ -485,14 +582,74 @@ def clip_to_rect(polygon, bbox):
 	"""
 	clips a polygon to a given bounding box
 	takes in a gisutils.Polygon and gisutils.Bounds2D
+	
+	polygons completely inside or outside the bounding box are
+	accepted or rejected right away. rings that cross each border of
+	the box at most twice are clipped with the Sutherland-Hodgman
+	algorithm, all others may be split into several pieces and are
+	clipped with Polygon instead
 	"""
 	from Polygon.Shapes import Rectangle
+	if len(polygon.coords) == 0:
+		return []
+	pb = polygon.bbox
+	if pb.right < bbox.left or pb.left > bbox.right or pb.bottom < bbox.top or pb.top > bbox.bottom:
+		return []
+	if pb.left >= bbox.left and pb.right <= bbox.right and pb.top >= bbox.top and pb.bottom <= bbox.bottom:
+		return [polygon]
+	
 	rect = Rectangle(bbox.width, bbox.height)
 	rect.shift(bbox.left, bbox.top)
-	
-	return clip_to_poly(polygon, rect)
-	
+	if not polygon.closed:
+		return clip_to_poly(polygon, rect)
+	
+	pts = polygon.visible_coords()
+	for axis, limit, keep_below in ((0, bbox.left, False), (0, bbox.right, True), (1, bbox.top, False), (1, bbox.bottom, True)):
+		if len(pts) < 3:
+			return []
+		pts = clip_to_halfplane(pts, axis, limit, keep_below)
+		if pts is None:
+			return clip_to_poly(polygon, rect)
+	if len(pts) < 3:
+		return []
+	return [Polygon(polygon.id, (pts[:,0], pts[:,1]), mode='arrays', data=polygon.data, closed=polygon.closed)]
+
 
+def clip_to_halfplane(pts, axis, limit, keep_below):
+	"""
+	clips a closed ring of (n,2) points against the half-plane
+	pts[:,axis] <= limit (or >= limit), one step of the
+	Sutherland-Hodgman algorithm. returns None if the ring crosses
+	the border more than twice, as the part inside may then consist
+	of several pieces, which Sutherland-Hodgman would join along
+	the border
+	"""
+	import numpy as np
+	nxt = np.roll(pts, -1, axis=0)
+	if keep_below:
+		inside = pts[:,axis] <= limit
+	else:
+		inside = pts[:,axis] >= limit
+	if inside.all():
+		return pts
+	next_inside = np.roll(inside, -1)
+	
+	# every edge emits the intersection with the border if it
+	# crosses it, followed by its end point if that is inside
+	crossing = inside != next_inside
+	if crossing.sum() > 2:
+		return None
+	with np.errstate(all='ignore'):
+		t = (limit - pts[:,axis]) / (nxt[:,axis] - pts[:,axis])
+		cut = pts + (nxt - pts) * t[:,np.newaxis]
+	cut[:,axis] = limit
+	out = np.empty((len(pts), 2, 2))
+	out[:,0] = cut
+	out[:,1] = nxt
+	emit = np.column_stack((crossing, next_inside))
+	return out[emit]
+
+	
 def clip_to_poly_pts(polygon, pts):
 	"""
 	"""
@@ -511,12 +668,7 @@ def clip_to_poly(polygon, clip_poly):
 	from Polygon import Polygon as Poly
 	
 	# step 1: create polygons from input data structures
-	pts = []
-	for p in polygon.points:
-		if p.deleted:
-			# skip deleted points
-			continue
-		pts.append((p.x, p.y))
+	pts = polygon.visible_coords().tolist()
 	
 	if len(pts) < 3:
 		return []
@@ -565,10 +717,7 @@ def polygon_to_poly(polygon):
 	converts a gisutils.Polygon to Polygon.Polygon
 	"""
 	from Polygon import Polygon as Poly
-	pts = []
-	for pt in polygon.points:
-		if pt.deleted: continue
-		pts.append((pt.x, pt.y))
+	pts = polygon.visible_coords().tolist()
 	if len(pts) < 3:
 		return None
 	return Poly(pts)
@@ -598,29 +747,77 @@ def merge_polygons(polygons, id='', data=None):
 		polygons[0].id = id
 		return polygons
 		
-	poly = polygon_to_poly(polygons[0])
-	for polygon in polygons[1:]:
-		poly2 = polygon_to_poly(polygon)
-		poly = poly | poly2
-		
-	return poly_to_polygons(poly)
+	poly = cascaded_union([polygon_to_poly(polygon) for polygon in polygons])
+	return poly_to_polygons(poly, id=id, data=data)
+
+
+def cascaded_union(polys):
+	"""
+	computes the union of a list of Polygon.Polygon by merging them
+	pairwise in a balanced tree, so that the intermediate results stay
+	small. returns None if the list is empty
+	"""
+	polys = [poly for poly in polys if poly is not None]
+	if len(polys) == 0:
+		return None
+	while len(polys) > 1:
+		merged = []
+		for i in range(0, len(polys) - 1, 2):
+			merged.append(polys[i] | polys[i+1])
+		if len(polys) % 2 == 1:
+			merged.append(polys[-1])
+		polys = merged
+	return polys[0]
+
+
+def parse_path_str(path_str):
+	"""
+	returns the contours of a SVG path string as lists of (x,y) tuples.
+	supports absolute and relative moveto, lineto and closepath commands
+	including implicit command repetition
+	"""
+	import re
+	tokens = re.findall(r'[MmLlZz]|[-+]?(?:[0-9]+\.?[0-9]*|\.[0-9]+)(?:[eE][-+]?[0-9]+)?', path_str)
+	contours = []
+	pts = []
+	x = y = x0 = y0 = 0.0
+	cmd = None
+	i = 0
+	while i < len(tokens):
+		t = tokens[i]
+		if t in 'MmLlZz':
+			cmd = t
+			i += 1
+			if cmd in 'Zz':
+				if len(pts) > 0: contours.append(pts)
+				pts = []
+				x, y = x0, y0
+			continue
+		dx, dy = float(t), float(tokens[i+1])
+		i += 2
+		if cmd in 'ml':
+			x, y = x + dx, y + dy
+		else:
+			x, y = dx, dy
+		if cmd in 'Mm':
+			if len(pts) > 0: contours.append(pts)
+			pts = []
+			x0, y0 = x, y
+			# following coordinate pairs are implicit lineto commands
+			cmd = ('L', 'l')[cmd == 'm']
+		pts.append((x, y))
+	if len(pts) > 0: contours.append(pts)
+	return contours
 
 
 def restore_poly_from_path_str(path_str):
 	"""
 	restores a list of polygons from a SVG path string
 	"""
-	contours = path_str.split('Z') #last contour may be empty
 	from Polygon import Polygon as Poly
 	poly = Poly()
-	for c_str in contours:
-		if c_str.strip() != "":
-			pts_str = c_str.strip()[1:].split("L")
-			pts = []
-			for pt_str in pts_str:
-				x,y = map(float, pt_str.split(','))
-				pts.append((x,y))
-			poly.addContour(pts, is_clockwise(pts))
+	for pts in parse_path_str(path_str):
+		poly.addContour(pts, is_clockwise(pts))
 	return poly
 	
 	
@@ -19,7 +19,7 @@
 
 # exceptions for some countries
 
-ignore = set('ATA')
+ignore = set(['ATA'])
 
 
 """
@@ -46,10 +46,27 @@ from gisutils import Bounds2D, Point, View, Polygon
 #from polygon import Polygon
 import gisutils
 import proj
+import topology
+from lrucache import LRUCache
 
 
 
-class Kartograph:
+class SourceDict(dict):
+	"""
+	dict whose entries are loaded on first access by calling load(key)
+	"""
+	def __init__(self, load):
+		dict.__init__(self)
+		self.load = load
+		
+	def __missing__(self, key):
+		value = self.load(key)
+		self[key] = value
+		return value
+
+
+
+class Kartograph(object):
 
 	def __init__(self, options=None, api2=False):
 		self.options = options
@@ -58,54 +75,124 @@ class Kartograph:
 		
 		self.options.applyDefaults()
 		
-		self.sf_reader = {} # shapefile reader
-		self.sf_recs = {} # shapefile record
-		self.sf_shapes = {} # shapefile shapes
-		self.shp_area = {} # shape area cache
+		# the shapefiles are loaded on first access
+		self.sf_reader = SourceDict(self.load_reader) # shapefile reader
+		self.sf_recs = SourceDict(self.load_records) # shapefile record
+		self.shp_area = SourceDict(self.init_area_cache) # shape area cache
+		self.shp_part_area = SourceDict(self.init_area_cache) # shape part areas cache
+		self.sf_rtree = {} # spatial index of shape bboxes
+		self.sf_attr_index = {} # attribute value -> shape indices
 		self.shp_src = {}
+		self.layer_filter = {} # layer id -> record filter of API 2.0 layers
+		self.lake_cache = LRUCache(16) # projection and view -> prepared lakes
+		self.country_bbox_cache = LRUCache(1000) # country and projection -> bbox
+		self._country_index = None
+		self._country_info = None
 	
 		if not api2:	
 			# deprecated stuff
-			self.shp_src['countries'] = self.options.data_path + 'shp/ne_10m_admin_0_countries'
-			self.shp_src['regions'] = self.options.data_path + 'shp/ne_10m_admin_1_states_provinces_shp'
-			self.shp_src['lakes'] = self.options.data_path + 'shp/ne_10m_lakes.shp'
-			self.load_shape_records()
-			self.build_country_index() 
+			self.shp_src.update(self.legacy_sources())
+		
 		
+	# deprecated
+	def legacy_sources(self):
+		"""
+		returns the natural earth shapefiles used by the render_... methods
+		"""
+		dp = self.options.data_path
+		return {
+			'countries': dp + 'shp/ne_10m_admin_0_countries',
+			'regions': dp + 'shp/ne_10m_admin_1_states_provinces_shp',
+			'lakes': dp + 'shp/ne_10m_lakes.shp'
+		}
 		
 
 	def load_shape_records(self):
 		"""
-		loads the shapefile records (but not the shapes)
+		loads the shapefile records (but not the shapes) of all sources.
+		usually not needed, since the records are loaded on first access
 		"""
-		import shapefile
-		options = self.options
-
-		# definition of shapefiles 		
+		if self.options.verbose: print "loading shapefile records"
+		for shpfile in self.shp_src:
+			self.sf_recs[shpfile]
+				
+	
+	def preload_sources(self, sources):
+		"""
+		loads the readers and all record columns of the given sources
+		and builds the indexes the render_... methods use. called before
+		worker processes are forked, so that they share the loaded data
+		instead of each loading it on first access
+		"""
+		for sf in sources:
+			self.sf_recs[sf].load()
+		if 'countries' in sources:
+			self.country_index
+			self.country_info
+			self.get_spatial_index('countries')
+		if 'regions' in sources:
+			self.get_attribute_index('regions', 2)
 		
-		if options.verbose: print "loading shapefile records"
+	
+	def load_reader(self, sf):
+		"""
+		opens the reader of a source, called on first access of sf_reader
+		"""
+		return self.open_shapefile(self.shp_src[sf])
 		
-		sread = self.sf_reader
-		srecs = self.sf_recs
-		sshp = self.sf_shapes
-		sarea = self.shp_area
+	
+	def load_records(self, sf):
+		"""
+		reads the records of a source, called on first access of sf_recs
+		"""
+		if self.options.verbose: print "loading records of "+sf
+		recs = self.sf_reader[sf].records()
+		if sf == 'countries' and self.shp_src[sf] == self.legacy_sources()[sf]:
+			for rec in recs:
+				if rec[29] == "SDS":
+					# fix natural earth South Sudan ISO3 code
+					rec[29] = "SSD"
+		return recs
 		
-		for shpfile in self.shp_src:
-			if shpfile in sread: continue
-			sread[shpfile] = shapefile.Reader(self.shp_src[shpfile]) # intantiate reader
-			srecs[shpfile] = sread[shpfile].records() # load records
-			sshp[shpfile] = [None]*len(srecs[shpfile]) # prepare shape cache
-			sarea[shpfile] = [None]*len(srecs[shpfile]) # prepare shp area cache
+	
+	def init_area_cache(self, sf):
+		"""
+		prepares the shape area cache of a source
+		"""
+		return [None]*self.sf_reader[sf].numRecords
 				
 
+	def open_shapefile(self, src):
+		"""
+		returns a memory-mapped reader for the compiled cache of a
+		shapefile, or for the shapefile itself if it's not compiled yet
+		"""
+		import shpcache
+		reader = shpcache.open_shapefile(src)
+		if self.options.verbose:
+			print "reading shapes from "+reader.path
+		if self.options.simplifier == 'precomputed' and reader.importance is None:
+			print "warning: %s has not been compiled, its shapes will not be simplified" % src
+		return reader
+
+
+	def compile_sources(self, sources=None):
+		"""
+		compiles the shapefiles into the binary cache format that is
+		used by load_shape_records and get_shape from now on
+		"""
+		import shpcache
+		if sources is None: sources = self.legacy_sources().values()
+		for src in sources:
+			shpcache.compile_shapefile(src, verbose=self.options.verbose)
+		
+
 	def get_shape(self, sf, index):
 		"""
-		returns a shapefile shape, either from cache or from shapefile reader
+		returns a shapefile shape whose points are a read-only view into
+		the memory-mapped shapefile (or compiled cache)
 		"""
-		shp = self.sf_shapes[sf][index]
-		if shp is None:
-			shp = self.sf_shapes[sf][index] = self.sf_reader[sf].shapeRecord(index).shape
-		return shp
+		return self.sf_reader[sf].shape(index)
 
 	def shape_area(self, sf, index):
 		"""
@@ -113,15 +200,140 @@ class Kartograph:
 		"""
 		if self.shp_area[sf][index] == None:
 			# not in cache, so compute
-			shp = self.get_shape(sf, index)
-			self.shp_area[sf][index] = gisutils.shape_area(shp)
+			self.shp_area[sf][index] = sum(self.part_areas(sf, index))
 			
 		return self.shp_area[sf][index]
 		
+	def part_areas(self, sf, index):
+		"""
+		returns the areas of all parts of a shape, either from cache or
+		freshly computed
+		"""
+		if self.shp_part_area[sf][index] == None:
+			shp = self.get_shape(sf, index)
+			self.shp_part_area[sf][index] = gisutils.part_areas(shp.points, shp.parts)
+			
+		return self.shp_part_area[sf][index]
+		
+	def get_attribute_index(self, sf, column):
+		"""
+		returns a dict that maps every value of a record column (given
+		by index or field name) to the list of record indices having it.
+		the index is built on first use and kept for later calls
+		"""
+		if not isinstance(column, int):
+			import errors
+			fields = [f[0] for f in self.sf_reader[sf].fields[1:]]
+			if column not in fields:
+				raise errors.ShapefileAttributesError('could not find an attribute named "'+column+'" in shapefile '+self.shp_src[sf]+'\n\navailable attributes are:\n'+' '.join(fields))
+			column = fields.index(column)
+		
+		if sf not in self.sf_attr_index:
+			self.sf_attr_index[sf] = {}
+		indexes = self.sf_attr_index[sf]
+		if column not in indexes:
+			index = {}
+			recs = self.sf_recs[sf]
+			for i in range(len(recs)):
+				val = recs[i][column]
+				if val in index:
+					index[val].append(i)
+				else:
+					index[val] = [i]
+			indexes[column] = index
+		return indexes[column]
+		
+		
+	def get_spatial_index(self, sf):
+		"""
+		returns a packed R-tree over the lon/lat bounding boxes of all
+		shapes in a shapefile, built on first use
+		"""
+		if sf not in self.sf_rtree:
+			from spatialindex import STRTree
+			reader = self.sf_reader[sf]
+			bboxes = [reader.bbox(i) for i in range(len(self.sf_recs[sf]))]
+			self.sf_rtree[sf] = STRTree(bboxes)
+		return self.sf_rtree[sf]
+		
+		
+	def get_view_llbbox(self, globe, view, viewbox, hint):
+		"""
+		estimates the lon/lat extent of the view by projecting a grid of
+		points around the lon/lat bbox hint. the sampled area is grown
+		until the view is completely inside. the points are projected
+		the way the shapes are (see Proj.plot_points). returns None if
+		the visible area can't be narrowed down (e.g. if it crosses the
+		dateline), so that all shapes are used
+		"""
+		import numpy as np
+		steps = 40
+		lon0, lat0, lon1, lat1 = hint
+		w = max(lon1 - lon0, 1.0)
+		h = max(lat1 - lat0, 1.0)
+		grow = 2
+		while grow < 64:
+			slon0 = max(-180.0, lon0 - w * grow)
+			slon1 = min(180.0, lon1 + w * grow)
+			slat0 = max(-90.0, lat0 - h * grow)
+			slat1 = min(90.0, lat1 + h * grow)
+			dx = (slon1 - slon0) / steps
+			dy = (slat1 - slat0) / steps
+			i, j = np.mgrid[0:steps+1, 0:steps+1]
+			lons = slon0 + i.ravel() * dx
+			lats = slat0 + j.ravel() * dy
+			xs, ys = globe.plot_points(lons, lats)
+			with np.errstate(invalid='ignore'):
+				xs, ys = view.project_array(xs, ys)
+				inside = (xs >= viewbox.left) & (xs <= viewbox.right) & (ys >= viewbox.top) & (ys <= viewbox.bottom)
+			if not inside.any():
+				return None
+			border = (i.ravel() % steps == 0) | (j.ravel() % steps == 0)
+			if not (inside & border).any():
+				lons = lons[inside]
+				lats = lats[inside]
+				return (float(lons.min()) - dx, float(lats.min()) - dy, float(lons.max()) + dx, float(lats.max()) + dy)
+			if slon0 == -180 and slon1 == 180 and slat0 == -90 and slat1 == 90:
+				return None
+			grow *= 2
+		return None
+		
+	
+	def get_view_candidates(self, sf, globe, view, viewbox, hint):
+		"""
+		returns the indices of all shapes whose lon/lat bbox intersects
+		the lon/lat extent of the view
+		"""
+		llbbox = None
+		if hint is not None:
+			llbbox = self.get_view_llbbox(globe, view, viewbox, hint)
+		if llbbox is None:
+			return range(len(self.sf_recs[sf]))
+		return self.get_spatial_index(sf).query(llbbox)
+		
+		
 	# deprecated	
-	def build_country_index(self):
+	@property
+	def country_index(self):
 		"""
-		creates a dict of iso3 -> index
+		dict of iso3 -> index of the country shape, built on first access
+		"""
+		if self._country_index is None:
+			self.build_country_index()
+		return self._country_index
+		
+	@property
+	def country_info(self):
+		"""
+		dict of iso3 -> country info record, read on first access
+		"""
+		if self._country_info is None:
+			self.load_country_info()
+		return self._country_info
+	
+	def load_country_info(self):
+		"""
+		reads the country codes from countryInfo.txt
 		"""
 		import csv
 		countryInfo = csv.reader(open(self.options.data_path + 'countryInfo.txt'), dialect='excel-tab')
@@ -130,17 +342,17 @@ class Kartograph:
 			if r[0][0] == "#": continue
 			iso2,iso3,ison,fips = r[0:4]
 			cinfo[iso3] = dict(iso3=iso3,iso2=iso2, num=ison, fips=fips)
-		self.country_info = cinfo
-		
+		self._country_info = cinfo
+	
+	def build_country_index(self):
+		"""
+		creates a dict of iso3 -> index
+		"""
 		country_recs = self.sf_recs['countries']
 		ci = {}
 		for i in range(len(country_recs)):
-			iso3 = country_recs[i][29]
-			if iso3 == "SDS":
-				# fix natural earth South Sudan ISO3 code
-				iso3 = country_recs[i][29] = "SSD"
-			ci[iso3] = i
-		self.country_index = ci
+			ci[country_recs[i][29]] = i
+		self._country_index = ci
 	
 	# deprecated
 	def get_country_record(self, iso3):
@@ -169,34 +381,39 @@ class Kartograph:
 		"""
 		returns a list of region shape indices for a country
 		"""
-		region_recs = self.sf_recs['regions']
-		reg_indices = []
-		for i in range(len(region_recs)):
-			if iso3 == region_recs[i][2]:
-				reg_indices.append(i)
-		return reg_indices
+		return list(self.get_attribute_index('regions', 2).get(iso3, []))
 		
 	
 	def get_country_bbox(self, iso3, globe):
 		""" 
-		returns the projected bounding box for a countries largest polygons
+		returns the projected bounding box for a countries largest polygons.
+		the bbox is cached per country and projection
 		"""	
+		import copy
 		min_area_percent = 0.2
 		options = self.options
 	
 		if iso3 in country_min_area:
 			# use value defined in exceptions
 			min_area_percent = country_min_area[iso3]
-	
+		
+		key = (iso3, globe.cache_key(), min_area_percent)
+		bbox = self.country_bbox_cache.get(key)
+		if bbox is None:
+			bbox = self.compute_country_bbox(iso3, globe, min_area_percent)
+			self.country_bbox_cache.put(key, bbox)
+		return copy.copy(bbox)
+		
+	def compute_country_bbox(self, iso3, globe, min_area_percent):
+		"""
+		projects all polygons of a country that are at least min_area_percent
+		as large as its largest polygon and returns their bounding box
+		"""
+		options = self.options
 		shape = self.get_country_shape(iso3)
 		parts = shape.parts[:]
 		parts.append(len(shape.points))
-		max_area = 0
-		areas = []
-		for j in range(0,len(parts)-1):
-			pts = shape.points[parts[j]:parts[j+1]]
-			a = gisutils.area(pts)
-			areas.append(a)
+		areas = self.part_areas('countries', self.country_index[iso3])
 		max_area = max(areas)
 		
 		bbox = Bounds2D()
@@ -208,17 +425,13 @@ class Kartograph:
 			pts = shape.points[parts[j]:parts[j+1]]
 			if areas[j] >= max_area * min_area_percent:
 				kept += 1
-				lonlat = []
-				for k in range(0,len(pts)):
-					lonlat.append((pts[k][0], pts[k][1]))
-				
-				mpoints = globe.plot(lonlat)
+				mpoints = globe.plot_array(pts)
 				
 				if mpoints == None: continue
-				for points in mpoints:
-					for xy in points:
-						pt = Point(xy[0], xy[1])
-						bbox.update(pt)
+				for xs, ys in mpoints:
+					if len(xs) == 0: continue
+					bbox.update((float(xs.min()), float(ys.min())))
+					bbox.update((float(xs.max()), float(ys.max())))
 			else:
 				skipped += 1
 				if options.verbose:
@@ -235,11 +448,10 @@ class Kartograph:
 		get bounding box for region
 		focusRegion = (7,'DE.BW')
 		"""
-		shapes = self.get_country_region_indices(iso3)
-		index,value = focusRegion
-		for s in shapes:
+		index,value = region
+		for s in self.get_attribute_index('regions', index).get(value, []):
 			rec = self.sf_recs['regions'][s]
-			if rec[index] == value:
+			if rec[2] == iso3:
 				return rec
 	
 	# deprecated
@@ -248,11 +460,9 @@ class Kartograph:
 		get bounding box for region
 		focusRegion = (7,'DE.BW')
 		"""
-		shapes = self.get_country_region_indices(iso3)
 		index,value = region
-		for s in shapes:
-			rec = self.sf_recs['regions'][s]
-			if rec[index] == value:
+		for s in self.get_attribute_index('regions', index).get(value, []):
+			if self.sf_recs['regions'][s][2] == iso3:
 				return self.get_shape('regions', s)
 				
 	# deprecated
@@ -269,15 +479,12 @@ class Kartograph:
 		bbox = Bounds2D()
 		for j in range(0,len(parts)-1):
 			pts = shp.points[parts[j]:parts[j+1]]
-			lonlat = []
-			for k in range(0,len(pts)):
-				lonlat.append((pts[k][0], pts[k][1]))
-			mpoints = globe.plot(lonlat)
+			mpoints = globe.plot_array(pts)
 			
-			for points in mpoints:
-				for xy in points:
-					pt = Point(xy[0], xy[1])
-					bbox.update(pt)
+			for xs, ys in mpoints:
+				if len(xs) == 0: continue
+				bbox.update((float(xs.min()), float(ys.min())))
+				bbox.update((float(xs.max()), float(ys.max())))
 		return bbox
 	
 	# deprecated
@@ -303,43 +510,144 @@ class Kartograph:
 		return bbox
 	
 
-	def init_svg_canvas(self, view, bbox, globe):
+	def init_svg_canvas(self, view, bbox, globe, iso3='', outfile=None):
 		"""
-		prepare a blank new svg file
+		starts a new svg map. the map is written to the output while
+		it's created, so save_or_display() must be called to finish it
 		"""
-		from svgfig import canvas, SVG
+		from svgwriter import SVGWriter
 		
 		options = self.options
 		w = view.width
 		h = view.height+2
 		
-		svg = canvas(width='%dpx' % w, height='%dpx' % h, viewBox='0 0 %d %d' % (w, h), enable_background='new 0 0 %d %d' % (w, h), style='stroke-width:0.7pt; stroke-linejoin: round; stroke:#444; fill:white;')
+		svg = SVGWriter(*self.open_output(iso3, outfile))
+		svg.start_document(width='%dpx' % w, height='%dpx' % h, viewBox='0 0 %d %d' % (w, h), enable_background='new 0 0 %d %d' % (w, h), style='stroke-width:0.7pt; stroke-linejoin: round; stroke:#444; fill:white;')
 	
 		css = 'path { fill-rule: evenodd; }\n#context path { fill: #eee; stroke: #bbb; } '
 		
 		if options.graticule:
 			css += '#graticule path { fill: none; stroke-width:0.25pt;  } #graticule .equator { stroke-width: 0.5pt } '
 	
-		svg.append(SVG('defs', SVG('style', css, type='text/css')))
+		svg.start('defs')
+		svg.element('style', css, type='text/css')
+		svg.end()
 	
-		meta = SVG('metadata')
-		views = SVG('views')
-		view = SVG('view', padding=str(options.out_padding), w=w, h=h)
-		proj = globe.toXML()
-		bbox = SVG('bbox', x=round(bbox.left,2), y=round(bbox.top,2), w=round(bbox.width,2), h=round(bbox.height,2))
+		svg.start('metadata')
+		svg.start('views')
+		svg.start('view', padding=str(options.out_padding), w=w, h=h)
+		svg.node(globe.toXML())
+		svg.element('bbox', x=round(bbox.left,2), y=round(bbox.top,2), w=round(bbox.width,2), h=round(bbox.height,2))
 		
 		ll = options.llbbox
-		llbbox = SVG('llbbox', lon0=ll[0],lon1=ll[2],lat0=ll[1],lat1=ll[3])
+		svg.element('llbbox', lon0=ll[0],lon1=ll[2],lat0=ll[1],lat1=ll[3])
+		svg.end()
+		svg.end()
+		svg.end()
+		
+		return svg
+		
+	
+	def open_output(self, iso3, outfile):
+		"""
+		opens the file a map is written to, returns the file, its path
+		and whether the file is closed once the map is finished. outfile
+		may also be a file-like object. maps that are not stored are
+		written to a temporary file, which is displayed in firefox once
+		the map is finished
+		"""
+		import os, os.path, svgwriter
+		level = self.compress_level(outfile)
+		if hasattr(outfile, 'write'):
+			out, close = svgwriter.open_output(outfile, level)
+			return (out, None, close)
+		if self.store_output(outfile):
+			if outfile == None: outfile = self.default_outfile(iso3)
+			if not os.path.isdir('tmp'):
+				os.mkdir('tmp')
+			out, close = svgwriter.open_output(outfile, level)
+			return (out, outfile, close)
+		import tempfile
+		fd, path = tempfile.mkstemp(suffix=self.output_extension())
+		os.close(fd)
+		out, close = svgwriter.open_output(path, level)
+		return (out, path, close)
 		
-		views.append(view)
-		view.append(proj)
-		view.append(bbox)
-		view.append(llbbox)
+	
+	def compress_level(self, outfile):
+		"""
+		returns the gzip compression level of a map or None if it's not
+		compressed. maps are compressed if a level is set in the options
+		or if they are written to a .svgz file
+		"""
+		level = self.options.compress_level
+		if level is None and isinstance(outfile, basestring) and outfile.lower().endswith('.svgz'):
+			level = 9
+		return level
 		
-		meta.append(views)
-		svg.append(meta)
+	
+	def default_outfile(self, iso3):
+		"""
+		returns the path of stored maps if no output file is given
+		"""
+		return 'tmp/'+iso3+self.output_extension()
 		
-		return svg
+	
+	def output_extension(self):
+		"""
+		returns the file extension of maps written to default locations
+		"""
+		if self.options.compress_level is None:
+			return '.svg'
+		return '.svgz'
+		
+	
+	def store_output(self, outfile):
+		"""
+		returns true if the map is stored, false if it's just displayed
+		"""
+		options = self.options
+		return outfile != None or (options.target_countries != None and options.target_countries[0] == 'all')
+		
+		
+	def read_svg_view(self, svg_src, layer_id=None):
+		"""
+		reads the view metadata of a svg map, without loading the entire
+		map into memory. returns the view, proj, bbox and llbbox elements
+		and the path strings of the layer with the given id (or None
+		if there is no such layer)
+		"""
+		from xml.etree.cElementTree import iterparse
+		from svgwriter import open_svg
+		
+		def tag(el):
+			return el.tag.split('}')[-1]
+		
+		view = None
+		paths = None
+		layer = None
+		src = open_svg(svg_src)
+		for event, el in iterparse(src, events=('start', 'end')):
+			t = tag(el)
+			if event == 'start':
+				if t == 'g' and layer_id != None and el.get('id') == layer_id and paths is None:
+					layer = el
+					paths = []
+				continue
+			if t == 'view' and view is None:
+				view = el
+			elif t == 'path' and layer is not None:
+				paths.append(el.get('d'))
+			elif t == 'g' and el is layer:
+				layer = None
+			if view is not el and t not in ('proj', 'bbox', 'llbbox'):
+				el.clear()
+		src.close()
+		
+		children = {}
+		for el in view:
+			children[tag(el)] = el
+		return view, children['proj'], children['bbox'], children['llbbox'], paths
 
 
 	def get_shape_polygons(self, shp, iso3, globe, view, data=None, holes=False):
@@ -350,31 +658,34 @@ class Kartograph:
 		if shp.shapeType in (3,5):
 			parts = shp.parts[:]
 			parts.append(len(shp.points))
+			importance = getattr(shp, 'importance', None)
+			if self.options.simplifier == 'precomputed' and importance is not None:
+				min_importance = self.get_importance_threshold(globe, view)
+			else:
+				importance = None
 			if data is None: data = {}
 			if iso3 != '' and iso3 != None and iso3 in self.country_info:
 				cinfo = self.country_info[iso3]
 				for k in cinfo:
 					data[k] = cinfo[k]
-			errs = 0
 			
 			#polygon = Polygon(data=data)
 			
 			for j in range(0,len(parts)-1):
 				pts = shp.points[parts[j]:parts[j+1]]
+				if importance is not None:
+					# drop the points removed by the precomputed simplification
+					pts = pts[importance[parts[j]:parts[j+1]] >= min_importance]
 				#lonlat = []
 				#for k in range(0,len(pts)):
 				#	lonlat.append((pts[k][0],pts[k][1]))
 				
-				mpoints = globe.plot(pts)
+				mpoints = globe.plot_array(pts)
 				if mpoints == None: continue
-				for points in mpoints:
-					poly_points = []
-					for xy in points:
-						if xy != None:
-							poly_points.append(view.project(Point(xy[0], xy[1])))
-						else: errs += 1
-					#polygon.addContour(poly_points, isHole=holes)
-					polygon = Polygon(iso3, poly_points, mode='point', data=data, closed=shp.shapeType == 5, isHole=holes)
+				for xs, ys in mpoints:
+					# project to view space and build the polygon in one go
+					xy = view.project_array(xs, ys)
+					polygon = Polygon(iso3, xy, mode='arrays', data=data, closed=shp.shapeType == 5, isHole=holes)
 					if polygon != None:
 						polys.append(polygon)
 		else:
@@ -382,6 +693,26 @@ class Kartograph:
 		return polys
 
 
+	def get_importance_threshold(self, globe, view):
+		"""
+		converts the simplification distance (in pixels) into the minimum
+		effective area (in square degrees) of the points that are kept by
+		the precomputed simplification. the scale is measured around the
+		center of the projection
+		"""
+		from math import hypot
+		lon0 = getattr(globe, 'lon0', 0)
+		lat0 = getattr(globe, 'lat0', 0)
+		d = 0.5
+		x0, y0 = globe.project(lon0 - d, lat0)
+		x1, y1 = globe.project(lon0 + d, lat0)
+		x2, y2 = globe.project(lon0, lat0 - d)
+		x3, y3 = globe.project(lon0, lat0 + d)
+		px_per_deg = (hypot(x1 - x0, y1 - y0) + hypot(x3 - x2, y3 - y2)) * .5 / (2 * d) * view.scale
+		dist = self.options.simplification / px_per_deg
+		return dist * dist
+
+
 	def get_polygon_data(self, rec, regions=False):
 		if regions:
 			data = { 'oid': rec[0], 'iso': rec[2] }
@@ -402,9 +733,9 @@ class Kartograph:
 		used for mode=country and mode=regions without context
 		"""
 		options = self.options
-		region_recs = self.sf_recs['regions']
 		
 		if regions:
+			region_recs = self.sf_recs['regions']
 			reg_indices = self.get_country_region_indices(iso3)
 			polys = []
 			for j in reg_indices:
@@ -434,12 +765,16 @@ class Kartograph:
 		focus_rec = self.get_country_record(country_iso3)
 		
 		country_recs = self.sf_recs['countries']
-		region_recs = self.sf_recs['regions']
 		
 		if regions:
+			region_recs = self.sf_recs['regions']
 			reg_indices = self.get_country_region_indices(country_iso3)
 		
-		for i in range(len(country_recs)):
+		# only project countries that may be visible in the view
+		hint = self.sf_reader['countries'].bbox(self.country_index[country_iso3])
+		candidates = self.get_view_candidates('countries', globe, view, viewbox, hint)
+		
+		for i in candidates:
 			iso3 = country_recs[i][29].upper()
 			if iso3 != country_iso3:
 				# this is not the center country	
@@ -467,33 +802,27 @@ class Kartograph:
 		return polygons
 
 
-	def get_polygon_filter(self, sfread):
+	def get_record_filter(self):
 		"""
-		returns a filter function
+		returns the --filter option as layer filter (see options.
+		parse_layer_filter), or None if no filter is set
 		"""
-		fm = self.options.filter_mode
-		fd = self.options.filter_codes
-		fc = False
-		
-		if fm:
-			filtcol = self.options.filter_column
-			fields = sfread.fields
-			for d in range(1,len(fields)):
-				if fields[d][0] == filtcol:
-					fc = d-1
-					if self.options.verbose:
-						print 'found filter column '+filtcol+' at '+str(fc)
-					break
-					
-		if fm != False and fc == False:
-			raise 'Cant find column '+filtcol
+		options = self.options
+		if not options.filter_mode:
+			return None
+		return { 'attribute': options.filter_column, 'type': ('include', 'exclude')[options.filter_mode == '-'], 'equals': options.filter_codes }
 		
-		def filt(rec):
-			id = str(rec[fc])
-			res = fm == False or (fm == '+' and id in fd) or (fm == '-' and id not in fd)
-			return res
-			
-		return filt
+	
+	def select_records(self, sfread, filter):
+		"""
+		returns the indices of all records of a shapefile reader that
+		pass the filter. only the filtered column is read
+		"""
+		if filter is None:
+			return range(sfread.numRecords)
+		if self.options.verbose:
+			print 'filtering by column '+filter['attribute']
+		return sfread.select(filter)
 		
 
 	def get_polygons_world(self, globe, view):
@@ -502,30 +831,34 @@ class Kartograph:
 		used for mode=world
 		"""
 		
-		filt = self.get_polygon_filter(self.sf_reader['countries'])
-		
 		polygons = []
 			
 		country_recs = self.sf_recs['countries']
 		
-		for i in range(len(country_recs)):
+		for i in self.select_records(self.sf_reader['countries'], self.get_record_filter()):
 			shp = self.get_shape('countries', i)
 			rec = country_recs[i]
 			iso3 = rec[29]
-			if filt(rec):
-				polygons += self.get_shape_polygons(shp, iso3, globe, view, data=self.get_polygon_data(country_recs[i]))
+			polygons += self.get_shape_polygons(shp, iso3, globe, view, data=self.get_polygon_data(rec))
 		
 		return polygons
 	
 	
-	def get_polygons_countries(self, viewbox, view, globe, regions=False):
+	def get_polygons_countries(self, viewbox, view, globe, regions=False, target_iso3s=None):
 		"""
 		returns a list of polygons that will be visible in the map
 		used for mode=countries
 		"""
 		polygons = []
 		country_recs = self.sf_recs['countries']
-		for i in range(len(country_recs)):
+		
+		hint = None
+		if target_iso3s is not None:
+			# only project countries that may be visible in the view
+			bboxes = [self.sf_reader['countries'].bbox(self.country_index[iso3]) for iso3 in target_iso3s]
+			hint = (min([b[0] for b in bboxes]), min([b[1] for b in bboxes]), max([b[2] for b in bboxes]), max([b[3] for b in bboxes]))
+		
+		for i in self.get_view_candidates('countries', globe, view, viewbox, hint):
 			rec = country_recs[i]
 			iso3 = rec[29].upper()
 			shp = self.get_shape('countries', i)
@@ -567,7 +900,7 @@ class Kartograph:
 				out.append(poly)
 		
 		for gid in groups:
-			polys = merge_polygons(groups[gid], id=iso3, data={ 'r-id': gid })
+			polys = gisutils.merge_polygons(groups[gid], id=iso3, data={ 'r-id': gid })
 			for poly in polys:
 				out.append(poly)		
 				
@@ -583,8 +916,11 @@ class Kartograph:
 		if options.verbose: print "simplifying polygons"
 		# join duplicate points
 		
+		if options.simplifier == 'precomputed':
+			# already simplified in get_shape_polygons
+			return
+		
 		gisutils.unify(polygons)
-		simplify = gisutils.simplify
 		
 		if focusFilter != None:
 			focus = []
@@ -595,16 +931,15 @@ class Kartograph:
 				else:
 					context.append(polygon)
 					
-			# simplify center country in the first pass	
-			for polygon in focus:
-				simplify(polygon, options.simplification)
-			
-			# simplify other countries in the snd pass
-			for polygon in context:
-				simplify(polygon, options.context_simplification)
+			# borders of the center country are simplified with its
+			# simplification, as it comes first
+			polygons = focus + context
+			dists = [options.simplification] * len(focus) + [options.context_simplification] * len(context)
 		else:
-			for polygon in polygons:
-				simplify(polygon, options.simplification)
+			dists = [options.simplification] * len(polygons)
+		
+		from simplifiers import simplifiers
+		topology.simplify(polygons, dists, simplifiers[options.simplifier])
 
 
 	def clip_polygons(self, polygons, viewbox):
@@ -676,21 +1011,14 @@ class Kartograph:
 					filtered.append(poly)
 			polygons = filtered
 			
-		from svgfig import SVG
 		from types import FunctionType
 		
-		svgGroup = SVG('g', id=layerId)
-		svg.append(svgGroup)
+		svg.start('g', id=layerId)
 		
 		if groupBy != None:
 			polyGroups = self.group_polygons(polygons, groupBy)
 			for group in polyGroups:
-				path_str_arr = []
-				for poly in group:
-					path_str_arr.append(poly.svgPathString(useInt=self.options.round_coordinates))
-				
-				# todo: looks ugly
-				svg_path = SVG('path', d=' '.join(path_str_arr))
+				svg_path = { 'd': gisutils.svg_path_string(group, useInt=self.options.round_coordinates, relative=self.options.compact_paths) }
 				poly = group[0]
 				
 				if type(polycolor) == FunctionType:
@@ -699,15 +1027,17 @@ class Kartograph:
 				for key in poly.data:
 					svg_path['data-'+key] = poly.data[key]
 						
-				svgGroup.append(svg_path)
+				svg.element('path', attrs=svg_path)
 		else:
 			for poly in polygons:			
-				svg_path = SVG('path', d=poly.svgPathString(useInt=options.round_coordinates))
+				svg_path = { 'd': poly.svgPathString(useInt=self.options.round_coordinates, relative=self.options.compact_paths) }
 				if type(polycolor) == FunctionType:
 					svg_path['fill'] = polycolor(poly.data)
 				for key in poly.data:
 					svg_path['data-'+key] = poly.data[key]
-				svgGroup.append(svg_path)
+				svg.element('path', attrs=svg_path)
+		
+		svg.end()
 
 
 	def get_sea_points(self, globe, view):
@@ -720,21 +1050,18 @@ class Kartograph:
 		
 
 	def add_sea_layer(self, svg, globe, view, viewbox):
-		from svgfig import SVG
-		
 		sea_pts = self.get_sea_points(globe, view)	
 		sea_polys = self.clip_polygons([Polygon('sea', sea_pts, mode='point')], viewbox)	
-		g = SVG('g', id='sea')
-		svg.append(g)
+		svg.start('g', id='sea')
 		for sea in sea_polys:
-			g.append(SVG('path', d=sea.svgPathString(useInt=False), style='fill:#d0ddf0', id="sea"))
+			svg.element('path', d=sea.svgPathString(useInt=False, relative=self.options.compact_paths), style='fill:#d0ddf0', id="sea")
+		svg.end()
 
 
 	def add_graticule(self, svg, globe, view, viewbox):
 		"""
 		"""
 		from clipping import Line
-		from svgfig import SVG
 		
 		options = self.options
 		lon0 = options.proj_opts['lon0']
@@ -752,8 +1079,7 @@ class Kartograph:
 				yield start
 				start += step
 
-		g = SVG('g', id='graticule', style="fill:none;stroke-width:0.25pt;")
-		svg.append(g)
+		svg.start('g', id='graticule', style="fill:none;stroke-width:0.25pt;")
 		for lat in xfrange(0,90, options.grat_step):
 			lats = ([lat, -lat], [0])[lat == 0]
 			for lat_ in lats:
@@ -782,10 +1108,10 @@ class Kartograph:
 					lines += line & viewbox
 					
 				for line in lines:
-					path = SVG('path', d=line.svgPathString(), data_lat=lat_)
+					path = { 'd': line.svgPathString(), 'data-lat': lat_ }
 					if lat == 0:
 						path['class'] = 'equator'
-					g.append(path)
+					svg.element('path', attrs=path)
 		
 		for lon in xfrange(0,181, options.grat_step):
 			lons = ([lon, -lon], [lon])[lon == 0 or lon == 180]
@@ -816,8 +1142,9 @@ class Kartograph:
 					lines += line & viewbox
 					
 				for line in lines:
-					path = SVG('path', d=line.svgPathString(), data_lon=lon0 - lon_)
-					g.append(path)
+					svg.element('path', d=line.svgPathString(), data_lon=lon0 - lon_)
+		
+		svg.end()
 					
 				
 				
@@ -842,7 +1169,7 @@ class Kartograph:
 						color = fills[loc[2]]
 					else:
 						color = '#c00'
-					svg.append(SVG('circle', cx=pt.x, cy=pt.y, r=str(radius), fill=color, stroke='none', opacity='.8'))
+					svg.element('circle', cx=pt.x, cy=pt.y, r=str(radius), fill=color, stroke='none', opacity='.8')
 		
 	
 	def get_view(self, bbox):
@@ -884,12 +1211,15 @@ class Kartograph:
 		globe = options.projection(**options.proj_opts)
 		llbbox = options.llbbox
 		
+		key = self.render_key(globe, ('world',), outfile)
+		if self.render_cached(key, 'worldmap', outfile): return
+		
 		bbox = globe.world_bounds(Bounds2D(), llbbox)
 	
 		view = self.get_view(bbox)	
 		viewbox = Bounds2D(width=view.width, height=view.height)
 		
-		svg = self.init_svg_canvas(view, bbox, globe)
+		svg = self.init_svg_canvas(view, bbox, globe, 'worldmap', outfile)
 	
 		if options.sea_layer:
 			self.add_sea_layer(svg, globe, view, viewbox)
@@ -908,7 +1238,7 @@ class Kartograph:
 			polygons = self.clip_polygons_to_sea(polygons, globe, view)
 		
 		self.add_map_layer(svg, polygons, 'countries', groupBy='iso')
-		self.save_or_display(svg, 'worldmap', outfile)
+		self.save_or_display(svg, 'worldmap', outfile, key)
 	
 	
 	
@@ -947,6 +1277,9 @@ class Kartograph:
 		# initialize map projection
 		globe = options.projection(**proj_opts)
 		
+		key = self.render_key(globe, ('countries', tuple(target_iso3s)), outfile)
+		if self.render_cached(key, '-'.join(target_iso3s), outfile): return
+		
 		# project countries to get bounding boxes
 		# and compute total bounding box and view
 		bbox = Bounds2D()
@@ -960,7 +1293,7 @@ class Kartograph:
 		viewBox = Bounds2D(width=view.width, height=view.height)	
 	
 		# init svg
-		svg = self.init_svg_canvas(view, bbox, globe)
+		svg = self.init_svg_canvas(view, bbox, globe, '-'.join(target_iso3s), outfile)
 		
 		# add sea background
 		if options.sea_layer:
@@ -971,7 +1304,7 @@ class Kartograph:
 		
 		
 		# render every country that intersects the view
-		polygons = self.get_polygons_countries(viewBox, view, globe)
+		polygons = self.get_polygons_countries(viewBox, view, globe, target_iso3s=target_iso3s)
 		self.simplify_polygons(polygons)
 		
 		if options.cut_lakes:
@@ -987,24 +1320,29 @@ class Kartograph:
 		self.add_map_layer(svg, polygons, 'countries', groupBy='iso', filter=_focus)
 		
 		# save and exit
-		self.save_or_display(svg, '-'.join(target_iso3s), outfile)
+		self.save_or_display(svg, '-'.join(target_iso3s), outfile, key)
 	
 	
 	
 	
 	
-	def render_regions_or_country(self):
-		
+	def render_regions_or_country(self, regions=False):
+		"""
+		renders all target countries (or all countries if the target is
+		'all') as separate maps. the maps are rendered by a pool of
+		options.processes worker processes, which are forked after the
+		shapefiles have been loaded so that they share them. returns a
+		list of (iso3, outfile, error) for all rendered maps, where error
+		is None if the map was rendered successfully
+		"""
 		options = self.options
 		import os, os.path
 		
-		load_shapefiles()
-		
 		iso_codes = options.target_countries
 		
 		if len(iso_codes) == 1 and iso_codes[0] == 'all':
 			iso_codes = []
-			for iso3, area in country_areas:
+			for iso3 in sorted(self.country_index):
 				if iso3 in ignore:
 					print "ignoring", iso3
 					continue
@@ -1013,31 +1351,79 @@ class Kartograph:
 		out_path = '.'
 		out_base = None
 		
-		if options.out_file != None:
-			out_path = os.path.dirname(options.out_file)
+		if options.outfile != None:
+			out_path = os.path.dirname(options.outfile)
 			if len(iso_codes) == 1:
-				out_base = os.path.basename(options.out_file)
-			
+				out_base = os.path.basename(options.outfile)
+		
+		jobs = []
 		for iso3 in iso_codes:	
-			if options.out_file != None:
+			if options.outfile != None:
 				outfile = out_path + os.sep if out_path != "" else ""
 				if out_base != None: outfile += out_base
-				else: outfile += iso3+'.svg'
+				else: outfile += iso3+self.output_extension()
 			else:
 				outfile = None
 				
 			if outfile != None and options.target_countries[0] == 'all' and not options.force_overwrite:
 				if os.path.isfile(outfile):
 					# skip, map exists
-					print "skipping %s - %s already exist"
+					print "skipping %s - %s already exist" % (iso3, outfile)
 					continue
+			
+			jobs.append((iso3, regions, outfile))
+		
+		if self.store_output(None) and not os.path.isdir('tmp'):
+			# create it before the workers compete for it
+			os.mkdir('tmp')
+		
+		# start with the most expensive maps, so that no worker is left
+		# with a big country at the end (longest processing time first)
+		jobs.sort(key=lambda job: self.render_cost(job[0], job[1]), reverse=True)
+		
+		global _batch
+		_batch = self
+		processes = options.processes
+		if processes == 0: 
+			import multiprocessing
+			processes = multiprocessing.cpu_count()
+		if processes > 1 and len(jobs) > 1:
+			from multiprocessing import Pool
+			sources = ['countries']
+			if regions: sources.append('regions')
+			if options.cut_lakes: sources.append('lakes')
+			self.preload_sources(sources)
+			pool = Pool(min(processes, len(jobs)))
+			results = list(pool.imap_unordered(_render_batch_job, jobs, chunksize=1))
+			pool.close()
+			pool.join()
+		else:
+			results = map(_render_batch_job, jobs)
+		_batch = None
 		
-			if options.add_context:
-				render_country_and_context(iso3, regions=(command == "regions"), outfile=outfile)
-			else:
-				render_country(iso3, outfile=outfile, regions=(command == "regions"))
-				
+		for iso3, outfile, error in results:
+			if error != None:
+				print "rendering %s failed:\n%s" % (iso3, error)
+		if options.verbose:
+			failed = len([r for r in results if r[2] != None])
+			print "rendered %d maps, %d failed" % (len(results) - failed, failed)
+		return results
 		
+	
+	def render_cost(self, iso3, regions=False):
+		"""
+		estimates the cost of rendering a country by the number of
+		points of its shape (and the shapes of its regions)
+		"""
+		if iso3 not in self.country_index:
+			return 0
+		cost = len(self.get_country_shape(iso3).points)
+		if regions:
+			for i in self.get_country_region_indices(iso3):
+				cost += len(self.get_shape('regions', i).points)
+		return cost
+		
+	
 	def render_country(self, iso3, regions=False, outfile=None, focusRegion=None):
 		"""
 		renders a single country or its regions
@@ -1061,6 +1447,9 @@ class Kartograph:
 		
 		# initialize projection, use center lat/lng from shape record as center
 		globe = options.projection(**proj_opts)
+		
+		key = self.render_key(globe, ('country', iso3, regions, focusRegion), outfile)
+		if self.render_cached(key, iso3, outfile): return
 	
 		if focusRegion == None:
 			bbox = self.get_country_bbox(iso3, globe)	
@@ -1070,7 +1459,7 @@ class Kartograph:
 		view = self.get_view(bbox)
 		viewbox = Bounds2D(width=view.width, height=view.height)	
 	
-		svg = self.init_svg_canvas(view, bbox, globe)
+		svg = self.init_svg_canvas(view, bbox, globe, iso3, outfile)
 		
 		# add sea background
 		if options.sea_layer:
@@ -1095,7 +1484,7 @@ class Kartograph:
 		
 		self.add_map_layer(svg, polygons, iso3, groupBy=('iso','oid')[regions])
 				
-		self.save_or_display(svg, iso3, outfile)
+		self.save_or_display(svg, iso3, outfile, key)
 	
 	
 	def render_country_and_context(self, iso3, regions=False, outfile=None, focusRegion=None):
@@ -1118,6 +1507,9 @@ class Kartograph:
 		
 		# initialize projection, use center lat/lng from shape record as center
 		globe = options.projection(**proj_opts)
+		
+		key = self.render_key(globe, ('country_and_context', iso3, regions, focusRegion), outfile)
+		if self.render_cached(key, iso3, outfile): return
 	
 		if focusRegion == None:
 			bbox = self.get_country_bbox(iso3, globe)	
@@ -1128,7 +1520,7 @@ class Kartograph:
 		view = self.get_view(bbox)
 		viewbox = Bounds2D(width=view.width, height=view.height)
 	
-		svg = self.init_svg_canvas(view, bbox, globe)
+		svg = self.init_svg_canvas(view, bbox, globe, iso3, outfile)
 		
 		# add sea background
 		if options.sea_layer:
@@ -1161,7 +1553,7 @@ class Kartograph:
 		
 		# draw_locations(svg, globe, view, country_iso3, "FIN", "FI", ['01'], fills={'03':'#c00', '06':'#03c'})	
 	
-		self.save_or_display(svg, iso3, outfile)
+		self.save_or_display(svg, iso3, outfile, key)
 	
 	
 	
@@ -1169,35 +1561,28 @@ class Kartograph:
 		"""
 		adds the content of a shapefile as a new map layer
 		"""
-		import svgfig, shapefile
+		from svgwriter import SVGWriter, open_svg
 		
 		if data_column == None: data_column = ()
 		
 		options = self.options
 		
-		svg = svgfig.load(svg_src)
-		
-		svg_views = svg[1][0]
-		
-		svg_view = svg_views[0]
-		svg_proj = svg_view[0]
-		svg_bbox = svg_view[1]
-		svg_llbbox = svg_view[2]
+		svg_view, svg_proj, svg_bbox, svg_llbbox, crop_paths = self.read_svg_view(svg_src, options.crop_at_layer)
 		
-		pd = float(svg_view['padding'])
+		pd = float(svg_view.get('padding'))
 		
 		globe = proj.Proj.fromXML(svg_proj)
-		bbox = Bounds2D(left=float(svg_bbox['x']), top=float(svg_bbox['y']), width=float(svg_bbox['w']), height=float(svg_bbox['h']))
+		bbox = Bounds2D(left=float(svg_bbox.get('x')), top=float(svg_bbox.get('y')), width=float(svg_bbox.get('w')), height=float(svg_bbox.get('h')))
 		
-		vh = float(svg_view['h'])
-		vw = float(svg_view['w'])
+		vh = float(svg_view.get('h'))
+		vw = float(svg_view.get('w'))
 		
 		options.out_width = vw
 		options.out_height = vh
 		options.force_ratio = True
 		options.out_padding = pd
 		
-		options.llbbox = map(float, (svg_llbbox['lon0'],svg_llbbox['lat0'],svg_llbbox['lon1'],svg_llbbox['lat1']))
+		options.llbbox = map(float, (svg_llbbox.get('lon0'),svg_llbbox.get('lat0'),svg_llbbox.get('lon1'),svg_llbbox.get('lat1')))
 		
 		view = self.get_view(bbox)
 		viewbox = Bounds2D(width=view.width, height=view.height)
@@ -1211,42 +1596,36 @@ class Kartograph:
 		layer_poly = None
 		if options.crop_at_layer != None:
 			from Polygon import Polygon as Poly
-			from Polygon.IO import writeSVG
 			from gisutils import restore_poly_from_path_str
 			
 			if options.verbose:
 				print 'crop at layer "%s"' %  options.crop_at_layer
-			for g in svg[2:]:
-				if g['id'] == options.crop_at_layer:
-					if options.verbose:
-						print 'found layer!'
-					# restore polygons from that layer
+			if crop_paths != None:
+				if options.verbose:
+					print 'found layer!'
+				# restore polygons from that layer
+				polys = []
+				for path_str in crop_paths:
+					polys.append(restore_poly_from_path_str(path_str))
+				layer_poly = gisutils.cascaded_union(polys)
+				if layer_poly is None:
 					layer_poly = Poly()
-					for path in g[:]:
-						path_str = path['d']
-						poly = restore_poly_from_path_str(path_str)
-						layer_poly = layer_poly | poly
-					break
 			
 		# read shapefile
 		
-		sf = shapefile.Reader(shp_src)
-		
-		filt = self.get_polygon_filter(sf)
+		sf = self.open_shapefile(shp_src)
 		
 		fields = []
 		for f in sf.fields[1:]:
 			fields.append(f[0])
 		
-		shprecs = sf.shapeRecords()
+		recs = sf.records()
 		
 		polygons = []
 		
-		for sx in range(len(shprecs)):
-			shp = shprecs[sx].shape
-			rec = shprecs[sx].record
-			if not filt(rec): 
-				continue
+		for sx in self.select_records(sf, self.get_record_filter()):
+			rec = recs[sx]
+			shp = sf.shape(sx)
 			data = { }
 			for d in data_column:
 				for f in range(len(fields)):
@@ -1280,28 +1659,86 @@ class Kartograph:
 					out += poly_to_polygons(poly_, id=polygon.id, data=polygon.data, closed=polygon.closed)
 			polygons = out
 			
+		# copy the map to the output, which may be the map itself
+		src = open_svg(svg_src)
+		content = src.read()
+		src.close()
+		svg = SVGWriter(*self.open_output("", outfile))
+		svg.continue_document(content)
+		del content
+		
 		self.add_map_layer(svg, polygons, options.layer_id, polycolor=polycolor)
 		
 		self.save_or_display(svg, "", outfile)
 		
 
-	def save_or_display(self, svg, iso3, outfile):
+	def save_or_display(self, svg, iso3, outfile, cache_key=None):
 		"""
-		this finally saves the SVG map or displays it in firefox 
+		this finally finishes the SVG map and displays it in firefox
+		if it's not stored. the map is added to the render cache if
+		a cache key is given
 		"""
 		options = self.options
-		import os, os.path
+		import os
+		
+		svg.close()
+		if cache_key != None and svg.path != None:
+			import rendercache
+			rendercache.store(options.render_cache, cache_key, svg.path, self.compress_level(outfile) != None)
+		if self.store_output(outfile):
+			if options.verbose and svg.path != None: print "stored as "+svg.path
+		else:
+			os.system('firefox %s' % svg.path)
+
+
+	def render_key(self, globe, target, outfile):
+		"""
+		returns the key of a map in the render cache, which depends on
+		the options, the projection, the rendered target and the source
+		data. returns None if the render cache is disabled
+		"""
+		import os.path, rendercache
+		options = self.options
+		if options.render_cache is None:
+			return None
+		fingerprints = [(sf, self.sf_reader[sf].fingerprint) for sf in sorted(self.shp_src)]
+		for name in ('countryInfo.txt', 'region_joins.csv'):
+			path = options.data_path + name
+			if os.path.exists(path):
+				fingerprints.append(rendercache.file_fingerprint(path))
+		target += (self.compress_level(outfile),)
+		return rendercache.render_key(options.cache_key(), globe.cache_key(), target, fingerprints)
 		
-		if outfile != None or (options.target_countries != None and options.target_countries[0] == 'all'):
-			if outfile == None: outfile = 'tmp/'+iso3+'.svg'
-			if not os.path.isdir('tmp'):
-				os.mkdir('tmp')
-			# svg.save(outfile)
-			open(outfile, 'w').write(svg.standalone_xml(indent="  ", newl=""))
+	
+	def render_cached(self, key, iso3, outfile):
+		"""
+		copies a map from the render cache to the output (or displays it),
+		returns False if the map is not cached
+		"""
+		import os, os.path, shutil, rendercache
+		options = self.options
+		if key is None:
+			return False
+		cached = rendercache.lookup(options.render_cache, key, self.compress_level(outfile) != None)
+		if cached is None:
+			return False
+		if options.verbose: print "using cached map "+cached
+		if hasattr(outfile, 'write'):
+			src = open(cached, 'rb')
+			shutil.copyfileobj(src, outfile)
+			src.close()
+			outfile.flush()
+		elif self.store_output(outfile):
+			if outfile == None:
+				outfile = self.default_outfile(iso3)
+				if not os.path.isdir('tmp'):
+					os.mkdir('tmp')
+			shutil.copyfile(cached, outfile)
 			if options.verbose: print "stored as "+outfile
 		else:
-			svg.firefox()
-
+			os.system('firefox %s' % cached)
+		return True
+		
 
 	def get_lake_polygons(self, globe, view, viewbox):
 		"""
@@ -1328,8 +1765,42 @@ class Kartograph:
 		if self.options.verbose:
 			print "cutting out lakes"
 		
-		lakes = self.get_lake_polygons(globe, view, viewbox)
+		lake_polys, lake_index = self.get_lakes(globe, view, viewbox)
+		
+		out = []
+		for polygon in polygons:
+			if len(polygon.visible_coords()) < 3:
+				continue
+			bbox = polygon.bbox
+			candidates = lake_index.query((bbox.left, bbox.top, bbox.right, bbox.bottom))
+			if len(candidates) == 0:
+				# no lake nearby, keep the polygon as it is
+				out.append(polygon)
+				continue
+			poly = polygon_to_poly(polygon)
+			for i in candidates:
+				poly = poly - lake_polys[i]
+			out += poly_to_polygons(poly, id=polygon.id, data=polygon.data, closed=polygon.closed)
+		return out
+		
 		
+	def get_lakes(self, globe, view, viewbox):
+		"""
+		returns the simplified lakes of a view, with overlapping lakes
+		combined into one Polygon.Polygon, along with a spatial index over
+		their bounding boxes. the lakes are cached per projection and view
+		"""
+		from gisutils import polygon_to_poly
+		from spatialindex import STRTree
+		
+		options = self.options
+		key = (globe.cache_key(), view.bbox.left, view.bbox.top, view.bbox.width, view.bbox.height, view.width, view.height, view.padding, 
+			viewbox.left, viewbox.top, viewbox.right, viewbox.bottom, options.simplification, options.simplifier)
+		lakes = self.lake_cache.get(key)
+		if lakes is not None:
+			return lakes
+		
+		lakes = self.get_lake_polygons(globe, view, viewbox)
 		self.simplify_polygons(lakes)
 		
 		lake_polys = []
@@ -1338,15 +1809,34 @@ class Kartograph:
 			if lake_poly is not None:
 				lake_polys.append(lake_poly)
 		
-		out = []
-		for polygon in polygons:
-			poly = polygon_to_poly(polygon)
-			if poly is None:
-				continue
-			for lake in lake_polys:
-				poly = poly - lake
-			out += poly_to_polygons(poly, id=polygon.id, data=polygon.data, closed=polygon.closed)
-		return out
+		# find groups of lakes with overlapping bboxes
+		bboxes = []
+		for lake_poly in lake_polys:
+			xmin, xmax, ymin, ymax = lake_poly.boundingBox()
+			bboxes.append((xmin, ymin, xmax, ymax))
+		index = STRTree(bboxes)
+		group = range(len(lake_polys))
+		def root(i):
+			while group[i] != i:
+				i = group[i]
+			return i
+		for i in range(len(bboxes)):
+			for j in index.query(bboxes[i]):
+				group[root(j)] = root(i)
+		
+		# combine each group into one lake
+		groups = {}
+		for i in range(len(lake_polys)):
+			groups.setdefault(root(i), []).append(lake_polys[i])
+		lake_polys = [gisutils.cascaded_union(groups[r]) for r in sorted(groups)]
+		bboxes = []
+		for lake_poly in lake_polys:
+			xmin, xmax, ymin, ymax = lake_poly.boundingBox()
+			bboxes.append((xmin, ymin, xmax, ymax))
+		
+		lakes = (lake_polys, STRTree(bboxes))
+		self.lake_cache.put(key, lakes)
+		return lakes
 		
 		
 	def merge_biggest_polygons(self, polygons, area_thresh=5000):
@@ -1380,8 +1870,20 @@ class Kartograph:
 		
 		
 	def prepare_layers(self, opts):
+		"""
+		registers the shapefiles and record filters of the layers, the
+		shapefiles are loaded once they are accessed
+		"""
+		for layer in opts['layers']:
+			self.shp_src[layer['id']] = layer['src']
+			self.layer_filter[layer['id']] = layer['filter'] or None
 		
-		self.load_shape_records()
+	
+	def get_layer_records(self, layer):
+		"""
+		returns the indices of the records of a layer that pass its filter
+		"""
+		return self.select_records(self.sf_reader[layer], self.layer_filter.get(layer))
 		
 		
 	def get_map_center(self, opts):
@@ -1396,7 +1898,7 @@ class Kartograph:
 		computes the (x,y) bounding box for the map, given a specific projection
 		"""
 		bnds = opts['bounds']
-		type = bnds['type']
+		bt = bnds['mode']
 		data = bnds['data']
 		
 		if bt == "bbox": # catch special case bbox
@@ -1411,10 +1913,23 @@ class Kartograph:
 				pt = proj.project(lon,lat)
 				bbox.update(pt)
 				
-		if bt == "polygons":
-			data['layer'] = 'countries'
-			data['idcol'] = 'ISO3'
-			data['ids'] = ['DEU','FRA','ESP']
+		if bt in ("polygons", "polygon"):
+			layer = data['layer']
+			index = self.get_attribute_index(layer, data['attribute'])
+			selected = set(self.get_layer_records(layer))
+			for id in data['ids']:
+				for i in index.get(id, []):
+					if i not in selected: continue
+					shp = self.get_shape(layer, i)
+					parts = shp.parts[:]
+					parts.append(len(shp.points))
+					for j in range(len(parts)-1):
+						mpoints = proj.plot_array(shp.points[parts[j]:parts[j+1]])
+						if mpoints is None: continue
+						for xs, ys in mpoints:
+							if len(xs) == 0: continue
+							bbox.update((float(xs.min()), float(ys.min())))
+							bbox.update((float(xs.max()), float(ys.max())))
 			
 		
 		return bbox
@@ -1423,6 +1938,26 @@ class Kartograph:
 
 
 
+# the Kartograph instance of the running batch, inherited by the worker
+# processes of render_regions_or_country
+_batch = None
+
+def _render_batch_job(job):
+	"""
+	renders a single map of a batch, returns (iso3, outfile, error)
+	"""
+	import traceback
+	iso3, regions, outfile = job
+	try:
+		if _batch.options.add_context:
+			_batch.render_country_and_context(iso3, regions=regions, outfile=outfile)
+		else:
+			_batch.render_country(iso3, outfile=outfile, regions=regions)
+	except Exception:
+		return (iso3, outfile, traceback.format_exc())
+	return (iso3, outfile, None)
+
+
 class KartographOptions(object):
 	"""
 	this class stores all options = self.options needed by this script
@@ -1439,7 +1974,12 @@ class KartographOptions(object):
 		self.shp_country_id_col = 2
 		self.force_overwrite = False
 		self.simplification = 2
+		self.simplifier = 'radial'
 		self.round_coordinates = False
+		self.compact_paths = False
+		self.compress_level = None
+		self.processes = 1
+		self.render_cache = None # directory of the render cache
 		self.context_simplification = None
 		self.verbose = False
 		self.target_countries = None
@@ -1476,6 +2016,23 @@ class KartographOptions(object):
 		self.filter_codes = []
 		self.filter_column = 'ISO_A3'
 	
+	def cache_key(self):
+		"""
+		returns all options that affect the rendered maps as sorted list
+		of (name, value) pairs, leaving out the ones that only control
+		where the maps go. out_ratio is left out unless it's forced,
+		since get_view sets it to the ratio of each rendered map
+		"""
+		skip = ('outfile', 'verbose', 'processes', 'force_overwrite', 'target_countries', 'render_cache')
+		key = []
+		for name, value in sorted(vars(self).items()):
+			if name in skip: continue
+			if name == 'out_ratio' and not self.force_ratio: continue
+			if name == 'projection' and value is not None:
+				value = value.__name__
+			key.append((name, value))
+		return key
+	
 	def applyDefaults(self, command=""):
 	
 		dw = 500    # defaults
@@ -0,0 +1,59 @@
+"""
+    kartograph - a svg mapping library
+    Copyright (C) 2011  Gregor Aisch
+
+    This program is free software: you can redistribute it and/or modify
+    it under the terms of the GNU Affero General Public License as
+    published by the Free Software Foundation, either version 3 of the
+    License, or (at your option) any later version.
+
+    This program is distributed in the hope that it will be useful,
+    but WITHOUT ANY WARRANTY; without even the implied warranty of
+    MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+    GNU Affero General Public License for more details.
+
+    You should have received a copy of the GNU Affero General Public License
+    along with this program.  If not, see <http://www.gnu.org/licenses/>.
+"""
+
+"""
+least recently used cache
+
+Keeps the finished maps of the render server, and the caches of
+Kartograph that are keyed by projection and view, which would otherwise
+grow without limit in a long-running server.
+"""
+
+import threading
+
+
+class LRUCache(object):
+	"""
+	thread-safe cache that drops the least recently used entries once
+	it holds more than size entries
+	"""
+	def __init__(self, size=100):
+		from collections import OrderedDict
+		self.size = size
+		self.entries = OrderedDict()
+		self.lock = threading.Lock()
+		self.hits = 0
+		self.misses = 0
+
+	def get(self, key):
+		with self.lock:
+			if key not in self.entries:
+				self.misses += 1
+				return None
+			self.hits += 1
+			value = self.entries.pop(key)
+			self.entries[key] = value
+			return value
+
+	def put(self, key, value):
+		if self.size <= 0: return
+		with self.lock:
+			self.entries.pop(key, None)
+			self.entries[key] = value
+			while len(self.entries) > self.size:
+				self.entries.popitem(last=False)
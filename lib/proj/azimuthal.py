@@ -19,6 +19,7 @@
 
 from base import Proj
 import math 
+import numpy as np
 
 class Azimuthal(Proj):
 
@@ -43,12 +44,24 @@ class Azimuthal(Proj):
 		# work out if the point is visible
 		cosc = math.sin(elevation)*math.sin(self.elevation0)+math.cos(self.elevation0)*math.cos(elevation)*math.cos(azimuth-self.azimuth0)
 		return cosc >= 0.0		
+	
+	def _cosc_array(self, lons, lats):
+		elevation = self.to_elevation(lats)
+		azimuth = self.to_azimuth(lons)
+		return np.sin(elevation)*math.sin(self.elevation0)+math.cos(self.elevation0)*np.cos(elevation)*np.cos(azimuth-self.azimuth0)
+	
+	def visible_array(self, lons, lats):
+		return self._cosc_array(lons, lats) >= 0.0
 		
 	def _truncate(self, x, y):
 		theta = math.atan2(y-self.r,x-self.r)
 		x1 = self.r + self.r * math.cos(theta)
 		y1 = self.r + self.r * math.sin(theta)
 		return (x1,y1)
+	
+	def truncate_array(self, xs, ys):
+		theta = np.arctan2(ys-self.r,xs-self.r)
+		return (self.r + self.r * np.cos(theta), self.r + self.r * np.sin(theta))
 		
 	def world_bounds(self, bbox, llbbox=(-180,-90,180,90)):
 		if llbbox == (-180,-90,180,90):
@@ -106,6 +119,14 @@ class Orthographic(Azimuthal):
 		x = self.r + xo
 		y = self.r + yo
 		return (x,y)
+	
+	def project_array(self, lons, lats):
+		lons,lats = self.ll_array(lons, lats)
+		elevation = self.to_elevation(lats)
+		azimuth = self.to_azimuth(lons)
+		xo = self.r*np.cos(elevation)*np.sin(azimuth-self.azimuth0)
+		yo = -self.r*(math.cos(self.elevation0)*np.sin(elevation)-math.sin(self.elevation0)*np.cos(elevation)*np.cos(azimuth-self.azimuth0))
+		return (self.r + xo, self.r + yo)
 		
 
 
@@ -141,6 +162,17 @@ class LAEA(Azimuthal):
 		y = self.r + yo
 		
 		return (x,y)
+	
+	def project_array(self, lons, lats):
+		phi = np.radians(lats)
+		lam = np.radians(lons)
+		cos_phi = np.cos(phi)
+		cos_lam = np.cos(lam - self.lam0)
+		k = np.power(2 / (1 + math.sin(self.phi0) * np.sin(phi) + math.cos(self.phi0)*cos_phi*cos_lam), .5)
+		k *= self.scale
+		xo = self.r * k * cos_phi * np.sin(lam - self.lam0)
+		yo = -self.r * k * ( math.cos(self.phi0)*np.sin(phi) - math.sin(self.phi0)*cos_phi*cos_lam )
+		return (self.r + xo, self.r + yo)
 
 	
 
@@ -170,6 +202,18 @@ class Stereographic(Azimuthal):
 		y = self.r + yo
 		
 		return (x,y)
+	
+	def project_array(self, lons, lats):
+		lons,lats = self.ll_array(lons, lats)
+		phi = np.radians(lats)
+		lam = np.radians(lons)
+		cos_phi = np.cos(phi)
+		cos_lam = np.cos(lam - self.lam0)
+		k0 = 0.5
+		k = 2*k0 / (1 + math.sin(self.phi0) * np.sin(phi) + math.cos(self.phi0)*cos_phi*cos_lam)
+		xo = self.r * k * cos_phi * np.sin(lam - self.lam0)
+		yo = -self.r * k * ( math.cos(self.phi0)*np.sin(phi) - math.sin(self.phi0)*cos_phi*cos_lam )
+		return (self.r + xo, self.r + yo)
 
 
 
@@ -194,14 +238,9 @@ class Satellite(Azimuthal):
 		self.tilt_ = math.radians(tilt)
 		
 		self.scale = 1
-		xmin = sys.maxint
-		xmax = sys.maxint*-1
-		for lat in range(0,180):
-			for lon in range(0,361):
-				x,y = self.project(lon-180,lat-90)
-				xmin = min(x, xmin)
-				xmax = max(x, xmax)
-		self.scale = (self.r*2)/(xmax-xmin) 
+		lons, lats = np.meshgrid(np.arange(0,361) - 180.0, np.arange(0,180) - 90.0)
+		xs, ys = self.project_array(lons.ravel(), lats.ravel())
+		self.scale = (self.r*2)/(xs.max()-xs.min()) 
 		
 		Azimuthal.__init__(self, lat0, lon0)
 		
@@ -238,6 +277,33 @@ class Satellite(Azimuthal):
 		y = self.r + yt	
 		
 		return (x,y)	
+	
+	def project_array(self, lons, lats):
+		lons,lats = self.ll_array(lons, lats)
+		phi = np.radians(lats)
+		lam = np.radians(lons)
+		cos_phi = np.cos(phi)
+		cos_lam = np.cos(lam - self.lam0)
+		
+		cos_c = math.sin(self.phi0) * np.sin(phi) + math.cos(self.phi0) * cos_phi * cos_lam
+		k = (self.dist - 1) / (self.dist - cos_c)
+		k *= self.scale
+		
+		xo = self.r * k * cos_phi * np.sin(lam - self.lam0)
+		yo = -self.r * k * ( math.cos(self.phi0)*np.sin(phi) - math.sin(self.phi0)*cos_phi*cos_lam )
+		
+		# rotate
+		tilt = self.tilt_
+		cos_up = math.cos(self.up_)
+		sin_up = math.sin(self.up_)
+		cos_tilt = math.cos(tilt)
+		
+		H = self.r * (self.dist - 1)
+		A = ((yo * cos_up + xo * sin_up) * math.sin(tilt/H)) + cos_tilt
+		xt = (xo * cos_up - yo * sin_up) * np.cos(tilt/A)
+		yt = (yo * cos_up + xo * sin_up) / A
+		
+		return (self.r + xt, self.r + yt)
 
 	def _visible(self, lon, lat):
 		elevation = self.to_elevation(lat)
@@ -246,6 +312,9 @@ class Satellite(Azimuthal):
 		cosc = math.sin(elevation)*math.sin(self.elevation0)+math.cos(self.elevation0)*math.cos(elevation)*math.cos(azimuth-self.azimuth0)
 		return cosc >= (1.0/self.dist)
 	
+	def visible_array(self, lons, lats):
+		return self._cosc_array(lons, lats) >= (1.0/self.dist)
+	
 	def toXML(self):
 		p = super(Satellite, self).toXML()
 		p['dist'] = str(self.dist)
@@ -292,9 +361,29 @@ class EquidistantAzimuthal(Azimuthal):
 		y = self.r + yo
 		
 		return (x,y)
+	
+	def project_array(self, lons, lats):
+		phi = np.radians(lats)
+		lam = np.radians(lons)
+		cos_phi = np.cos(phi)
+		cos_lam = np.cos(lam - self.lam0)
+		
+		cos_c = math.sin(self.phi0) * np.sin(phi) + math.cos(self.phi0) * cos_phi * cos_lam
+		c = np.arccos(np.clip(cos_c, -1, 1))
+		sin_c = np.sin(c)
+		k = np.ones(len(c))
+		nz = sin_c != 0
+		k[nz] = 0.325 * c[nz] / sin_c[nz]
+		
+		xo = self.r * k * cos_phi * np.sin(lam - self.lam0)
+		yo = -self.r * k * ( math.cos(self.phi0)*np.sin(phi) - math.sin(self.phi0)*cos_phi*cos_lam )
+		return (self.r + xo, self.r + yo)
 		
 	def _visible(self, lon, lat):
 		return True
+	
+	def visible_array(self, lons, lats):
+		return np.ones(len(lons), dtype=bool)
 
 
 
@@ -313,4 +402,9 @@ class Aitoff(EquidistantAzimuthal):
 		x,y = EquidistantAzimuthal.project(self, lon, lat)
 		y *= .5
 		return (x,y)
+	
+	def project_array(self, lons, lats):
+		xs,ys = EquidistantAzimuthal.project_array(self, lons, lats)
+		ys *= .5
+		return (xs,ys)
 
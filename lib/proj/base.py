@@ -18,6 +18,7 @@
 
 import math 
 from math import radians as rad
+import numpy as np
 
 
 class Proj(object):
@@ -31,33 +32,90 @@ class Proj(object):
 	maxLat = 90
 					
 	def plot(self, polygon, truncate=True):
-		points = []
-		ignore = True
-		for (lon,lat) in polygon:
-			vis = self._visible(lon, lat)
-			if vis:
-				ignore = False
-			x,y = self.project(lon, lat)
-			if not vis and truncate:
-				points.append(self._truncate(x,y))
-			else:
-				points.append((x,y))
-		if ignore:
+		mpoints = self.plot_array(polygon, truncate)
+		if mpoints is None:
+			return None
+		return [zip(xs.tolist(), ys.tolist()) for (xs, ys) in mpoints]
+		
+	def plot_array(self, polygon, truncate=True):
+		"""
+		projects a list (or (n,2) array) of lon/lat points at once and
+		returns a list of (xs, ys) arrays, or None if no point is visible
+		"""
+		pts = np.asarray(polygon, dtype=np.float64).reshape((-1, 2))
+		lons = pts[:,0]
+		lats = pts[:,1]
+		vis = self.visible_array(lons, lats)
+		if not vis.any():
 			return None
-		return [points]
+		with np.errstate(all='ignore'):
+			xs, ys = self.project_array(lons, lats)
+			if truncate and not vis.all():
+				hidden = ~vis
+				xs[hidden], ys[hidden] = self.truncate_array(xs[hidden], ys[hidden])
+		ok = np.isfinite(xs) & np.isfinite(ys)
+		if not ok.all():
+			# points that could not be projected
+			xs = xs[ok]
+			ys = ys[ok]
+		return [(xs, ys)]
+		
+	def plot_points(self, lons, lats):
+		"""
+		projects arrays of single lon/lat points the same way plot_array
+		projects polygons. points that are not visible become nan
+		"""
+		vis = self.visible_array(lons, lats)
+		with np.errstate(all='ignore'):
+			xs, ys = self.project_array(lons, lats)
+		xs = np.where(vis, xs, np.nan)
+		ys = np.where(vis, ys, np.nan)
+		return (xs, ys)
 		
 	def ll(self, lon, lat):
 		return (lon,lat)
 	
+	def ll_array(self, lons, lats):
+		return (lons, lats)
+	
 	def project(self, lon, lat):
 		assert False, 'Proj is an abstract class'
+	
+	def project_array(self, lons, lats):
+		"""
+		projects arrays of lon/lat coordinates, returns arrays of x and y.
+		this generic version calls project() for every point, subclasses
+		override it with a vectorized implementation
+		"""
+		n = len(lons)
+		xs = np.empty(n)
+		ys = np.empty(n)
+		for i in range(n):
+			xy = self.project(lons[i], lats[i])
+			if xy is None:
+				xy = (np.nan, np.nan)
+			xs[i], ys[i] = xy
+		return (xs, ys)
 				
 	def _visible(self, lon, lat):
 		assert False, 'Proj is an abstract class'
 	
+	def visible_array(self, lons, lats):
+		"""
+		returns a boolean array telling which lon/lat points are visible
+		"""
+		return np.array([self._visible(lons[i], lats[i]) for i in range(len(lons))], dtype=bool)
+	
 	def _truncate(self, x, y):
 		assert False, 'truncation is not implemented'
 	
+	def truncate_array(self, xs, ys):
+		"""
+		truncates arrays of projected points that are not visible
+		"""
+		out = [self._truncate(xs[i], ys[i]) for i in range(len(xs))]
+		return (np.array([xy[0] for xy in out]), np.array([xy[1] for xy in out]))
+	
 	def world_bounds(self, bbox, llbbox=(-180,-90,180,90)):
 		sea = self.sea_shape(llbbox)	
 		for x,y in sea:
@@ -104,6 +162,13 @@ class Proj(object):
 		p = SVG('proj', id=self.name)
 		return p
 	
+	def cache_key(self):
+		"""
+		returns a hashable key of the projection and all its parameters
+		"""
+		params = [(k, v) for (k, v) in sorted(vars(self).items()) if isinstance(v, (int, long, float, str))]
+		return (self.__class__.__name__,) + tuple(params)
+	
 	@staticmethod
 	def attributes():
 		"""
@@ -113,13 +178,21 @@ class Proj(object):
 	
 	@staticmethod
 	def fromXML(xml):
-		id = xml['id']
+		"""
+		restores a projection from its xml element, which is either a
+		svgfig.SVG or an ElementTree element
+		"""
+		from . import projections
+		if hasattr(xml, 'attrib'):
+			attrs = dict(xml.attrib)
+		else:
+			attrs = dict([(prop[0], val) for (prop, val) in xml])
+		id = attrs.pop('id')
 		if id in projections:
 			ProjClass = projections[id]
 			args = {}
-			for (prop,val) in xml:
-				if prop[0] != "id":
-					args[prop[0]] = float(val)
+			for prop in attrs:
+				args[prop] = float(attrs[prop])
 			return ProjClass(**args)
 		raise Exception("could not restore projection from xml")
 		
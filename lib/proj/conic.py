@@ -19,6 +19,8 @@
 
 from base import Proj
 import math 
+from math import radians as rad
+import numpy as np
 		
 class Conic(Proj):
 	def __init__(self, lat0=0, lon0=0, lat1=0, lat2=0):
@@ -34,9 +36,15 @@ class Conic(Proj):
 		
 	def _visible(self, lon, lat):
 		return True
+	
+	def visible_array(self, lons, lats):
+		return np.ones(len(lons), dtype=bool)
 		
 	def _truncate(self, x, y):
 		return (x,y)
+	
+	def truncate_array(self, xs, ys):
+		return (xs, ys)
 		
 		
 	def toXML(self):
@@ -88,4 +96,16 @@ class LCC(Conic):
 		x = 1000 * rho * math.sin(lam_)
 		y = 1000 * (self.rho0 - rho * math.cos(lam_))
 		
+		return (x,y*-1)
+	
+	def project_array(self, lons, lats):
+		lons,lats = self.ll_array(lons, lats)
+		phi = np.radians(lats)
+		lam = np.radians(lons)
+		n = self.n
+		rho = self.c * np.power(np.tan(self.QUARTERPI + 0.5 * phi), -n)
+		rho[np.abs(np.abs(phi) - self.HALFPI) < 1e-10] = 0.0
+		lam_ = (lam - self.lam0) * n
+		x = 1000 * rho * np.sin(lam_)
+		y = 1000 * (self.rho0 - rho * np.cos(lam_))
 		return (x,y*-1)
\ No newline at end of file
@@ -18,6 +18,8 @@
 
 from base import Proj
 import math 
+from math import radians as rad
+import numpy as np
 
 class Cylindrical(Proj):
 
@@ -35,17 +37,24 @@ class Cylindrical(Proj):
 			from Polygon import Polygon as Poly 
 			self.inside_p = Poly(sea)
 			
-	def plot(self, polygon, truncate=True):
+	def plot_array(self, polygon, truncate=True):
 		if self.lon0 != 0.0:
 			polygons = self._shift_polygon(polygon)
 			plotted = []
 			for polygon in polygons:
-				plotted += super(Cylindrical, self).plot(polygon, False)
+				plotted += super(Cylindrical, self).plot_array(polygon, False)
 			return plotted
 		else:
-			return super(Cylindrical, self).plot(polygon, False)
+			return super(Cylindrical, self).plot_array(polygon, False)
 
 
+	def plot_points(self, lons, lats):
+		if self.lon0 != 0.0:
+			# same shift as in _shift_polygon
+			lons = np.asarray(lons, dtype=np.float64) - self.lon0
+			lons = np.where(lons < -180, lons + 360, np.where(lons > 180, lons - 360, lons))
+		return super(Cylindrical, self).plot_points(lons, lats)
+		
 	def _shift_polygon(self, polygon):
 		"""
 		shifts a polygon according to the origin longitude
@@ -82,9 +91,15 @@ class Cylindrical(Proj):
 
 	def _visible(self, lon, lat):
 		return True	
+	
+	def visible_array(self, lons, lats):
+		return np.ones(len(lons), dtype=bool)
 		
 	def _truncate(self, x, y):
 		return (x,y)
+	
+	def truncate_array(self, xs, ys):
+		return (xs, ys)
 		
 	def toXML(self):
 		p = super(Cylindrical, self).toXML()
@@ -103,6 +118,11 @@ class Cylindrical(Proj):
 		if self.flip == 1:
 			return (-lon, -lat)
 		return (lon,lat)
+	
+	def ll_array(self, lons, lats):
+		if self.flip == 1:
+			return (-lons, -lats)
+		return (lons, lats)
 
 
 class Equirectangular(Cylindrical):
@@ -117,6 +137,10 @@ class Equirectangular(Cylindrical):
 	def project(self, lon, lat):
 		lon,lat = self.ll(lon,lat)
 		return (lon * math.cos(self.phi0)*1000, lat*-1*1000)
+	
+	def project_array(self, lons, lats):
+		lons,lats = self.ll_array(lons,lats)
+		return (lons * math.cos(self.phi0)*1000, lats*-1*1000)
 
 
 class CEA(Cylindrical):
@@ -138,6 +162,14 @@ class CEA(Cylindrical):
 		x = (lam) * math.cos(self.phi1) * 1000
 		y = math.sin(phi) / math.cos(self.phi1) * 1000
 		return (x,y)
+	
+	def project_array(self, lons, lats):
+		lons,lats = self.ll_array(lons, lats)
+		lam = np.radians(lons)
+		phi = np.radians(lats*-1)
+		x = (lam) * math.cos(self.phi1) * 1000
+		y = np.sin(phi) / math.cos(self.phi1) * 1000
+		return (x,y)
 		
 	def toXML(self):
 		p = super(CEA, self).toXML()
@@ -186,3 +218,11 @@ class Mercator(Cylindrical):
 		x = lam * 1000
 		y = math.log((1+math.sin(phi)) / math.cos(phi)) * 1000
 		return (x,y)
+	
+	def project_array(self, lons, lats):
+		lons,lats = self.ll_array(lons, lats)
+		lam = np.radians(lons)
+		phi = np.radians(lats*-1)
+		x = lam * 1000
+		y = np.log((1+np.sin(phi)) / np.cos(phi)) * 1000
+		return (x,y)
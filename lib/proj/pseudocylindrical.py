@@ -18,6 +18,7 @@
 
 from cylindrical import Cylindrical
 import math
+import numpy as np
 from math import radians as rad
 
 class PseudoCylindrical(Cylindrical):
@@ -61,6 +62,16 @@ class NaturalEarth(PseudoCylindrical):
 		x = lplam * (self.A0 + phi2 * (self.A1 + phi2 * (self.A2 + phi4 * phi2 * (self.A3 + phi2 * self.A4)))) * 180 + 500
 		y = lpphi * (self.B0 + phi2 * (self.B1 + phi4 * (self.B2 + self.B3 * phi2 + self.B4 * phi4))) * 180 + 270
 		return (x,y)
+	
+	def project_array(self, lons, lats):
+		lons,lats = self.ll_array(lons, lats)
+		lplam = np.radians(lons)
+		lpphi = np.radians(lats*-1)
+		phi2 = lpphi * lpphi
+		phi4 = phi2 * phi2
+		x = lplam * (self.A0 + phi2 * (self.A1 + phi2 * (self.A2 + phi4 * phi2 * (self.A3 + phi2 * self.A4)))) * 180 + 500
+		y = lpphi * (self.B0 + phi2 * (self.B1 + phi4 * (self.B2 + self.B3 * phi2 + self.B4 * phi4))) * 180 + 270
+		return (x,y)
 
 
 class Robinson(PseudoCylindrical):
@@ -97,6 +108,22 @@ class Robinson(PseudoCylindrical):
 			y = -y
 			
 		return (x,y)
+	
+	def project_array(self, lons, lats):
+		lons,lats = self.ll_array(lons, lats)
+		lplam = np.radians(lons)
+		lpphi = np.radians(lats*-1)
+		
+		phi = np.abs(lpphi)
+		i = np.minimum((phi * self.C1).astype(int), self.NODES - 1)
+		phi = np.degrees(phi - self.RC1 * i)
+		i *= 4
+		X = np.array(self.X)
+		Y = np.array(self.Y)
+		x = self._poly(X, i, phi) * self.FXC * lplam
+		y = self._poly(Y, i, phi) * self.FYC
+		y[lpphi < 0.0] *= -1
+		return (x,y)
 
 
 
@@ -140,6 +167,35 @@ class EckertIV(PseudoCylindrical):
 			x = self.C_x * lplam * (1. + math.cos(lpphi))
 			y = self.C_y * math.sin(lpphi);
 		return (x,y);
+	
+	def project_array(self, lons, lats):
+		lons,lats = self.ll_array(lons, lats)
+		lplam = np.radians(lons)
+		lpphi = np.radians(lats*-1)
+		
+		p = self.C_p * np.sin(lpphi)
+		V = lpphi * lpphi
+		lpphi *= 0.895168 + V * ( 0.0218849 + V * 0.00826809 )
+		
+		# newton iteration, stops for every point once it converged
+		converged = np.zeros(len(lpphi), dtype=bool)
+		for i in range(self.NITER):
+			act = ~converged
+			if not act.any():
+				break
+			phi = lpphi[act]
+			c = np.cos(phi)
+			s = np.sin(phi)
+			V = (phi + s * (c + 2.) - p[act]) / (1. + c * (c + 2.) - s * s)
+			lpphi[act] = phi - V
+			converged[act] = np.abs(V) < self.EPS
+		
+		x = self.C_x * lplam * (1. + np.cos(lpphi))
+		y = self.C_y * np.sin(lpphi)
+		failed = ~converged
+		x[failed] = self.C_x * lplam[failed]
+		y[failed] = np.where(lpphi[failed] < 0, -self.C_y, self.C_y)
+		return (x,y)
 
 
 		
@@ -155,6 +211,12 @@ class Sinusoidal(PseudoCylindrical):
 		x = lam * math.cos(phi)
 		y = phi
 		return (x,y)
+	
+	def project_array(self, lons, lats):
+		lons,lats = self.ll_array(lons, lats)
+		lam = np.radians(lons)
+		phi = np.radians(lats*-1)
+		return (lam * np.cos(phi), phi)
 
 	
 	
@@ -202,6 +264,31 @@ class Mollweide(PseudoCylindrical):
 		x = 1000 * self.cx * lam * math.cos(phi)
 		y = 1000 * self.cy * math.sin(phi)
 		return (x,y*-1)
+	
+	def project_array(self, lons, lats):
+		lons,lats = self.ll_array(lons, lats)
+		lam = np.radians(lons)
+		phi = np.radians(lats)
+		
+		k = self.cp * np.sin(phi)
+		# newton iteration, stops for every point once it converged
+		converged = np.zeros(len(phi), dtype=bool)
+		for i in range(self.MAX_ITER):
+			act = ~converged
+			if not act.any():
+				break
+			phi_ = phi[act]
+			v = (phi_ + np.sin(phi_) - k[act]) / (1. + np.cos(phi_))
+			phi[act] = phi_ - v
+			converged[act] = np.abs(v) < self.TOLERANCE
+		
+		phi[converged] *= 0.5
+		failed = ~converged
+		phi[failed] = np.where(phi[failed] < 0, -self.HALFPI, self.HALFPI)
+		
+		x = 1000 * self.cx * lam * np.cos(phi)
+		y = 1000 * self.cy * np.sin(phi)
+		return (x,y*-1)
 
 	
 	
@@ -243,6 +330,20 @@ class Loximuthal(PseudoCylindrical):
 		x *= 1000
 		y = 1000 * (phi - self.phi0)
 		return (x,y*-1)
+	
+	def project_array(self, lons, lats):
+		lons,lats = self.ll_array(lons, lats)
+		lam = np.radians(lons)
+		phi = np.radians(lats)
+		d = np.log(np.tan(self.QUARTERPI + phi*0.5)) - math.log(math.tan(self.QUARTERPI + self.phi0*0.5))
+		x = lam * (phi - self.phi0) / d
+		# points that can't be projected
+		x[~np.isfinite(d)] = np.nan
+		at_phi0 = phi == self.phi0
+		x[at_phi0] = lam[at_phi0] * math.cos(self.phi0)
+		x *= 1000
+		y = 1000 * (phi - self.phi0)
+		return (x,y*-1)
 		
 	def toXML(self):
 		p = super(Loximuthal, self).toXML()
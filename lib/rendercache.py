@@ -0,0 +1,86 @@
+"""
+    kartograph - a svg mapping library
+    Copyright (C) 2011  Gregor Aisch
+
+    This program is free software: you can redistribute it and/or modify
+    it under the terms of the GNU Affero General Public License as
+    published by the Free Software Foundation, either version 3 of the
+    License, or (at your option) any later version.
+
+    This program is distributed in the hope that it will be useful,
+    but WITHOUT ANY WARRANTY; without even the implied warranty of
+    MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+    GNU Affero General Public License for more details.
+
+    You should have received a copy of the GNU Affero General Public License
+    along with this program.  If not, see <http://www.gnu.org/licenses/>.
+"""
+
+"""
+content-addressed cache of rendered maps
+
+Every map is stored under the sha1 hash of everything that goes into it:
+the effective options, the projection and its parameters, the rendered
+target (e.g. the iso3 code and whether regions are shown) and the
+fingerprints of the source data. Rendering a map with the same inputs
+again just copies the cached file, while changed options or data lead
+to a different key. Compressed maps are stored as .svgz.
+"""
+
+import os, os.path
+
+CACHE_VERSION = 2
+
+
+def render_key(options, proj, target, fingerprints):
+	"""
+	returns the cache key of a map as hex digest
+	"""
+	import hashlib
+	h = hashlib.sha1()
+	for part in (CACHE_VERSION, options, proj, target, fingerprints):
+		h.update(repr(part))
+		h.update('\0')
+	return h.hexdigest()
+
+
+def file_fingerprint(path):
+	"""
+	returns size and modification time of a file
+	"""
+	st = os.stat(path)
+	return [path, st.st_size, int(st.st_mtime)]
+
+
+def cached_path(cache_dir, key, compressed=False):
+	if compressed:
+		return os.path.join(cache_dir, key + '.svgz')
+	return os.path.join(cache_dir, key + '.svg')
+
+
+def lookup(cache_dir, key, compressed=False):
+	"""
+	returns the path of the cached map or None if it is not cached
+	"""
+	path = cached_path(cache_dir, key, compressed)
+	if os.path.exists(path):
+		return path
+	return None
+
+
+def store(cache_dir, key, src, compressed=False):
+	"""
+	copies a rendered map into the cache. the map is copied to a
+	temporary file first, so that concurrent renderers never see
+	an incomplete map
+	"""
+	import shutil, tempfile
+	if not os.path.isdir(cache_dir):
+		try:
+			os.makedirs(cache_dir)
+		except OSError:
+			if not os.path.isdir(cache_dir): raise
+	fd, tmp = tempfile.mkstemp(dir=cache_dir, suffix='.tmp')
+	os.close(fd)
+	shutil.copyfile(src, tmp)
+	os.rename(tmp, cached_path(cache_dir, key, compressed))
@@ -0,0 +1,284 @@
+"""
+    kartograph - a svg mapping library
+    Copyright (C) 2011  Gregor Aisch
+
+    This program is free software: you can redistribute it and/or modify
+    it under the terms of the GNU Affero General Public License as
+    published by the Free Software Foundation, either version 3 of the
+    License, or (at your option) any later version.
+
+    This program is distributed in the hope that it will be useful,
+    but WITHOUT ANY WARRANTY; without even the implied warranty of
+    MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+    GNU Affero General Public License for more details.
+
+    You should have received a copy of the GNU Affero General Public License
+    along with this program.  If not, see <http://www.gnu.org/licenses/>.
+"""
+
+"""
+local render server
+
+Loads the shapefiles and their indexes once and renders maps on request
+via HTTP:
+
+	/world
+	/country/DEU           (or /country/DEU,FRA for several countries)
+	/regions/DEU
+	/region/DEU/COLUMN/VALUE
+	/layer?svg=map.svg&shp=counties.shp
+
+Options are passed as query parameters named like the command line
+options, e.g. /country/DEU?context&sea&proj=robinson&width=500. The maps
+are rendered by a bounded pool of worker processes, which are forked
+once the sources are loaded, so that they share them. Each worker keeps
+its own per-projection caches (e.g. the prepared lakes), finished maps
+are kept in a LRU cache.
+"""
+
+import BaseHTTPServer, SocketServer
+from errors import RenderRequestError, UnknownTargetError
+from lrucache import LRUCache
+
+
+# the RenderServer of the running server, inherited by the worker
+# processes of its pool
+_server = None
+
+def _render_job(job):
+	"""
+	renders a map in a worker process, returns (result, error) where
+	error is a RenderRequestError or the traceback of a failed render
+	"""
+	import traceback
+	path, params = job
+	try:
+		return (_server.render_map(path, params), None)
+	except RenderRequestError, err:
+		return (None, err)
+	except Exception:
+		return (None, traceback.format_exc())
+
+
+def apply_params(options, params):
+	"""
+	sets the options given as query parameters, which are named like
+	the command line options
+	"""
+	import math
+	import proj
+	from simplifiers import simplifiers
+
+	def quality(value):
+		q = max(0, min(100, float(value)))/100.0
+		return 100 - math.pow(q,.25)*100
+
+	for name in params:
+		a = params[name]
+		try:
+			if name == 'width': options.out_width = int(a)
+			elif name == 'height': options.out_height = int(a)
+			elif name == 'ratio':
+				options.out_ratio = float(a)
+				options.force_ratio = True
+			elif name == 'padding': options.out_padding_perc = float(a)/100
+			elif name == 'quality': options.simplification = quality(a)
+			elif name == 'context-quality': options.context_simplification = quality(a)
+			elif name == 'simplifier':
+				if a not in simplifiers and a != 'precomputed':
+					raise RenderRequestError('simplifier "%s" not found' % a)
+				options.simplifier = a
+			elif name == 'context': options.add_context = True
+			elif name == 'sea': options.sea_layer = True
+			elif name == 'join-regions': options.join_regions = True
+			elif name == 'graticule':
+				options.graticule = True
+				if a != '': options.grat_step = int(a)
+			elif name == 'round-coordinates': options.round_coordinates = True
+			elif name == 'compact-paths': options.compact_paths = True
+			elif name == 'compress': options.compress_level = max(1, min(9, int(a)))
+			elif name == 'cut-lakes': options.cut_lakes = True
+			elif name == 'layer-id': options.layer_id = a
+			elif name == 'crop-at-layer': options.crop_at_layer = a
+			elif name == 'data-col': options.layer_data_column = a.split(',')
+			elif name == 'proj':
+				if a not in proj.projections:
+					raise RenderRequestError('projection "%s" not found' % a)
+				options.projection = proj.projections[a]
+			elif name in ('lon0', 'lat0', 'lat1', 'lat2', 'dist', 'up', 'tilt'):
+				options.proj_opts[name] = float(a)
+				if name == 'lon0': options.force_lon0 = True
+				if name == 'lat0': options.force_lat0 = True
+			elif name == 'flip': options.proj_opts['flip'] = 1
+			elif name == 'filter':
+				options.filter_mode = a[0]
+				options.filter_codes = a[1:].upper().split(',')
+			elif name == 'filter-col': options.filter_column = a
+			elif name in ('svg', 'shp'): pass # arguments of layer requests
+			else:
+				raise RenderRequestError('unknown option "%s"' % name)
+		except (ValueError, IndexError):
+			raise RenderRequestError('invalid value for option "%s"' % name)
+
+
+class RenderServer(object):
+	"""
+	renders maps with the sources loaded once. the worker processes
+	are forked after loading, and every render gets a shallow copy of
+	the Kartograph instance with its own options, so the loaded
+	shapefiles and indexes are shared by all renders
+	"""
+	def __init__(self, options=None, workers=4, cache_size=100):
+		import copy
+		from multiprocessing import Pool
+		from kartograph import Kartograph, KartographOptions
+		if options is None: options = KartographOptions()
+		self.defaults = copy.deepcopy(options)
+		self.kartograph = Kartograph(options)
+		# the sources are loaded on first access, so they're loaded here
+		# before the workers are forked
+		self.kartograph.preload_sources(self.kartograph.shp_src.keys())
+		global _server
+		_server = self
+		self.pool = Pool(workers)
+		self.cache = LRUCache(cache_size)
+
+	def render(self, path, params):
+		"""
+		renders the map for a request path (as list of its parts) and
+		query parameters. returns the map and whether it's compressed
+		"""
+		if len(path) == 0:
+			raise RenderRequestError('no command given')
+		key = None
+		if path[0] != 'layer':
+			# layers depend on the map files, so they're not cached
+			key = (tuple(path), tuple(sorted(params.items())))
+			result = self.cache.get(key)
+			if result is not None:
+				return result
+		result, error = self.pool.apply(_render_job, ((path, params),))
+		if isinstance(error, RenderRequestError):
+			raise error
+		if error is not None:
+			raise RuntimeError('rendering failed:\n' + error)
+		if key is not None:
+			self.cache.put(key, result)
+		return result
+
+	def render_map(self, path, params):
+		"""
+		renders a map in one of the worker processes
+		"""
+		import copy
+		from cStringIO import StringIO
+		command, args = path[0], path[1:]
+		options = copy.deepcopy(self.defaults)
+		apply_params(options, params)
+		K = copy.copy(self.kartograph)
+		K.options = options
+		out = StringIO()
+
+		def expect(n):
+			if len(args) != n:
+				raise RenderRequestError('wrong number of arguments for %s' % command)
+		
+		def check_country(iso3):
+			if iso3 not in K.country_index:
+				raise UnknownTargetError('unknown country "%s"' % iso3)
+
+		if command == 'world':
+			expect(0)
+			options.applyDefaults(command)
+			K.render_world_map(outfile=out)
+		elif command in ('country', 'regions'):
+			expect(1)
+			options.applyDefaults(command)
+			iso3s = args[0].upper().split(',')
+			for iso3 in iso3s:
+				check_country(iso3)
+			if len(iso3s) > 1:
+				K.render_countries(iso3s, outfile=out)
+			elif options.add_context:
+				K.render_country_and_context(iso3s[0], regions=command == 'regions', outfile=out)
+			else:
+				K.render_country(iso3s[0], regions=command == 'regions', outfile=out)
+		elif command == 'region':
+			expect(3)
+			options.applyDefaults(command)
+			iso3 = args[0].upper()
+			check_country(iso3)
+			try:
+				focus = (int(args[1]), args[2])
+			except ValueError:
+				raise RenderRequestError('invalid region column "%s"' % args[1])
+			if focus[0] < 0 or focus[0] >= len(K.sf_reader['regions'].fields) - 1:
+				raise RenderRequestError('invalid region column "%s"' % args[1])
+			if K.get_region_shape(iso3, focus) is None:
+				raise UnknownTargetError('unknown region "%s" of %s' % (args[2], iso3))
+			if options.add_context:
+				K.render_country_and_context(iso3, regions=True, outfile=out, focusRegion=focus)
+			else:
+				K.render_country(iso3, regions=True, outfile=out, focusRegion=focus)
+		elif command == 'layer':
+			expect(0)
+			if 'svg' not in params or 'shp' not in params:
+				raise RenderRequestError('layer requests need the svg and shp parameters')
+			options.applyDefaults(command)
+			K.add_shapefile_layer(params['svg'], params['shp'], data_column=options.layer_data_column, outfile=out)
+		else:
+			raise RenderRequestError('unknown command "%s"' % command)
+		return (out.getvalue(), options.compress_level is not None)
+
+
+class RenderRequestHandler(BaseHTTPServer.BaseHTTPRequestHandler):
+	"""
+	answers GET requests with rendered maps
+	"""
+	def do_GET(self):
+		import urllib, urlparse, traceback
+		url = urlparse.urlparse(self.path)
+		path = [urllib.unquote(p) for p in url.path.split('/') if p != '']
+		params = dict(urlparse.parse_qsl(url.query, keep_blank_values=True))
+		try:
+			svg, compressed = self.server.renderer.render(path, params)
+		except UnknownTargetError, err:
+			self.send_error(404, str(err))
+			return
+		except RenderRequestError, err:
+			self.send_error(400, str(err))
+			return
+		except Exception:
+			self.log_error('%s', traceback.format_exc())
+			self.send_error(500)
+			return
+		self.send_response(200)
+		self.send_header('Content-Type', 'image/svg+xml; charset=utf-8')
+		if compressed:
+			self.send_header('Content-Encoding', 'gzip')
+		self.send_header('Content-Length', str(len(svg)))
+		self.end_headers()
+		self.wfile.write(svg)
+
+
+class RenderHTTPServer(SocketServer.ThreadingMixIn, BaseHTTPServer.HTTPServer):
+	daemon_threads = True
+
+	def __init__(self, address, renderer):
+		BaseHTTPServer.HTTPServer.__init__(self, address, RenderRequestHandler)
+		self.renderer = renderer
+
+
+def serve(options=None, host='127.0.0.1', port=8080, workers=4, cache_size=100):
+	"""
+	loads the sources and serves maps until interrupted
+	"""
+	renderer = RenderServer(options, workers=workers, cache_size=cache_size)
+	httpd = RenderHTTPServer((host, port), renderer)
+	print 'serving maps on http://%s:%d/' % (host, port)
+	try:
+		httpd.serve_forever()
+	except KeyboardInterrupt:
+		pass
+	httpd.server_close()
+	renderer.pool.terminate()
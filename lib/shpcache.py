@@ -0,0 +1,342 @@
+"""
+    kartograph - a svg mapping library
+    Copyright (C) 2011  Gregor Aisch
+
+    This program is free software: you can redistribute it and/or modify
+    it under the terms of the GNU Affero General Public License as
+    published by the Free Software Foundation, either version 3 of the
+    License, or (at your option) any later version.
+
+    This program is distributed in the hope that it will be useful,
+    but WITHOUT ANY WARRANTY; without even the implied warranty of
+    MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+    GNU Affero General Public License for more details.
+
+    You should have received a copy of the GNU Affero General Public License
+    along with this program.  If not, see <http://www.gnu.org/licenses/>.
+"""
+
+"""
+compiled shapefile cache
+
+A shapefile is compiled once into a directory next to the source
+(e.g. ne_10m_lakes.kcache/) which holds
+
+- coords.npy   flat float64 array of all (lon,lat) points
+- parts.npy    offsets of every part into coords
+- shapes.npy   offsets of every shape into parts
+- bbox.npy     lon/lat bounding box (xmin,ymin,xmax,ymax) per shape
+- types.npy    shape type per shape
+- importance.npy  Visvalingam effective area (in square degrees) of every
+               point, see vertex_importance()
+- columns/     one pickled list of values per DBF column
+- meta.json    fields, record count and the fingerprint of the source
+
+All arrays are memory-mapped, so shapes are returned as read-only views
+into the page cache instead of being copied into Python lists. Shapefiles
+that have not been compiled are mapped directly via MappedShapefile.
+"""
+
+import os, os.path
+
+CACHE_VERSION = 3
+
+
+def source_path(src):
+	"""
+	returns the shapefile path without the .shp extension
+	"""
+	if src[-4:].lower() == '.shp':
+		src = src[:-4]
+	return src
+
+
+def cache_path(src):
+	"""
+	returns the location of the compiled cache of a shapefile
+	"""
+	return source_path(src) + '.kcache'
+
+
+def source_fingerprint(src):
+	"""
+	returns size and modification time of the .shp and .dbf files
+	"""
+	src = source_path(src)
+	fp = []
+	for ext in ('.shp', '.dbf'):
+		st = os.stat(src + ext)
+		fp.append([ext, st.st_size, int(st.st_mtime)])
+	return fp
+
+
+def compile_shapefile(src, dst=None, verbose=False):
+	"""
+	compiles a shapefile into the columnar binary cache format
+	"""
+	import shapefile, json
+	import cPickle as pickle
+	import numpy as np
+	from dbfreader import DBFReader
+
+	if dst is None: dst = cache_path(src)
+	sf = shapefile.Reader(source_path(src))
+	dbf = DBFReader(source_path(src) + '.dbf')
+	shapes = sf.shapes()
+
+	coords = []
+	parts = [0]
+	shape_offsets = [0]
+	bboxes = []
+	types = []
+
+	for shp in shapes:
+		base = len(coords)
+		if shp.shapeType != 0 and len(shp.points) > 0:
+			offsets = list(shp.parts) if hasattr(shp, 'parts') else [0]
+			for p in offsets[1:]:
+				parts.append(base + p)
+			parts.append(base + len(shp.points))
+			for pt in shp.points:
+				coords.append((pt[0], pt[1]))
+		if hasattr(shp, 'bbox'):
+			bboxes.append(list(shp.bbox))
+		elif len(shp.points) > 0:
+			lons = [pt[0] for pt in shp.points]
+			lats = [pt[1] for pt in shp.points]
+			bboxes.append([min(lons), min(lats), max(lons), max(lats)])
+		else:
+			bboxes.append([0, 0, 0, 0])
+		types.append(shp.shapeType)
+		shape_offsets.append(len(parts) - 1)
+
+	if not os.path.isdir(dst):
+		os.makedirs(dst)
+	if not os.path.isdir(os.path.join(dst, 'columns')):
+		os.mkdir(os.path.join(dst, 'columns'))
+
+	np.save(os.path.join(dst, 'coords.npy'), np.array(coords, dtype=np.float64).reshape((len(coords), 2)))
+	np.save(os.path.join(dst, 'parts.npy'), np.array(parts, dtype=np.int64))
+	np.save(os.path.join(dst, 'shapes.npy'), np.array(shape_offsets, dtype=np.int64))
+	np.save(os.path.join(dst, 'bbox.npy'), np.array(bboxes, dtype=np.float64).reshape((len(bboxes), 4)))
+	np.save(os.path.join(dst, 'types.npy'), np.array(types, dtype=np.int32))
+	importance = vertex_importance(np.load(os.path.join(dst, 'coords.npy')), parts, shape_offsets, types)
+	np.save(os.path.join(dst, 'importance.npy'), importance)
+
+	for c in range(len(dbf.fields) - 1):
+		pickle.dump(dbf.column(c), open(os.path.join(dst, 'columns', '%d.pkl' % c), 'wb'), pickle.HIGHEST_PROTOCOL)
+
+	meta = dict(version=CACHE_VERSION, fields=dbf.fields, numRecords=dbf.numRecords, fingerprint=source_fingerprint(src))
+	open(os.path.join(dst, 'meta.json'), 'w').write(json.dumps(meta))
+
+	if verbose:
+		print 'compiled %s (%d shapes, %d points)' % (src, len(shapes), len(coords))
+	return dst
+
+
+def vertex_importance(coords, parts, shape_offsets, types):
+	"""
+	computes the importance of every point in lon/lat space, which is
+	its effective area in the Visvalingam-Whyatt simplification. shared
+	borders are split into arcs (see topology), so that neighboring
+	shapes get the same importance along their common border. junctions
+	and points of point shapes get an infinite importance
+	"""
+	import numpy as np
+	import gisutils, topology
+	importance = np.empty(len(coords), dtype=np.float32)
+	importance.fill(np.inf)
+	polygons = []
+	offsets = []
+	for i in range(len(types)):
+		if types[i] not in (3, 5): continue
+		for p in range(shape_offsets[i], shape_offsets[i+1]):
+			ring = coords[parts[p]:parts[p+1]]
+			polygons.append(gisutils.Polygon(None, (ring[:,0], ring[:,1]), mode='arrays', closed=types[i] == 5))
+			offsets.append(parts[p])
+	gisutils.unify(polygons)
+	areas = topology.effective_areas(polygons)
+	for offset, a in zip(offsets, areas):
+		importance[offset:offset+len(a)] = a
+	return importance
+
+
+def open_shapefile(src):
+	"""
+	returns the compiled cache of a shapefile if available, otherwise
+	a memory-mapped reader over the shapefile itself
+	"""
+	reader = load(src)
+	if reader is None:
+		reader = MappedShapefile(src)
+	return reader
+
+
+def load(src):
+	"""
+	returns a CompiledShapefile for a shapefile if an up-to-date cache
+	exists, otherwise None
+	"""
+	import json
+	path = cache_path(src)
+	meta_src = os.path.join(path, 'meta.json')
+	if not os.path.exists(meta_src):
+		return None
+	meta = json.loads(open(meta_src).read())
+	if meta['version'] != CACHE_VERSION:
+		return None
+	if os.path.exists(source_path(src) + '.shp'):
+		# ignore caches of shapefiles that have changed since
+		if meta['fingerprint'] != source_fingerprint(src):
+			return None
+	return CompiledShapefile(path, meta)
+
+
+class CachedShape(object):
+	"""
+	a shape restored from the cache, offering the same attributes
+	as the shapes of the shapefile library. points is a read-only
+	(n,2) array view, so it must be copied before modifying it.
+	importance holds the precomputed importance of every point, or
+	None if the shapefile has not been compiled
+	"""
+	def __init__(self, shapeType, points, parts, bbox, importance=None):
+		self.shapeType = shapeType
+		self.points = points
+		self.parts = parts
+		self.bbox = bbox
+		self.importance = importance
+
+
+class CompiledShapefile(object):
+	"""
+	reads shapes and records from a compiled cache, mimics the interface
+	of shapefile.Reader
+	"""
+	def __init__(self, path, meta):
+		import numpy as np
+		self.path = path
+		self.fields = [tuple(f) for f in meta['fields']]
+		self.numRecords = meta['numRecords']
+		self.fingerprint = meta['fingerprint']
+		self.coords = np.load(os.path.join(path, 'coords.npy'), mmap_mode='r')
+		self.part_offsets = np.load(os.path.join(path, 'parts.npy'), mmap_mode='r')
+		self.shape_offsets = np.load(os.path.join(path, 'shapes.npy'), mmap_mode='r')
+		self.bboxes = np.load(os.path.join(path, 'bbox.npy'), mmap_mode='r')
+		self.types = np.load(os.path.join(path, 'types.npy'), mmap_mode='r')
+		self.importance = np.load(os.path.join(path, 'importance.npy'), mmap_mode='r')
+
+	def column(self, c):
+		"""
+		returns all values of a single DBF column
+		"""
+		import cPickle as pickle
+		return pickle.load(open(os.path.join(self.path, 'columns', '%d.pkl' % c), 'rb'))
+
+	def records(self):
+		"""
+		returns the records, whose columns are loaded on first access
+		"""
+		from dbfreader import ColumnRecords
+		return ColumnRecords(self.numRecords, len(self.fields) - 1, self.column)
+
+	def select(self, filter):
+		"""
+		returns the indices of the records that pass a layer filter
+		"""
+		import dbfreader
+		return dbfreader.select(self, filter)
+
+	def bbox(self, i):
+		"""
+		returns the lon/lat bounding box of a shape
+		"""
+		return self.bboxes[i].tolist()
+
+	def shape(self, i):
+		p0 = self.shape_offsets[i]
+		p1 = self.shape_offsets[i+1]
+		offsets = self.part_offsets[p0:p1+1]
+		if len(offsets) < 2:
+			return CachedShape(int(self.types[i]), self.coords[0:0], [], self.bboxes[i].tolist())
+		start = offsets[0]
+		points = self.coords[start:offsets[-1]]
+		parts = [int(o - start) for o in offsets[:-1]]
+		importance = self.importance[start:offsets[-1]]
+		return CachedShape(int(self.types[i]), points, parts, self.bboxes[i].tolist(), importance)
+
+
+class MappedShapefile(object):
+	"""
+	memory-mapped reader over the .shp, .shx and .dbf files of a
+	shapefile, mimics the interface of shapefile.Reader
+	"""
+	def __init__(self, src):
+		import numpy as np
+		from dbfreader import DBFReader
+		src = source_path(src)
+		self.path = src + '.shp'
+		self.shp = np.memmap(src + '.shp', dtype=np.uint8, mode='r')
+		shx = np.memmap(src + '.shx', dtype='>i4', mode='r', offset=100)
+		self.offsets = shx[0::2] # record offsets in 16-bit words
+		self.numRecords = len(self.offsets)
+		self.dbf = DBFReader(src + '.dbf')
+		self.fields = self.dbf.fields
+		self.fingerprint = source_fingerprint(src)
+		self.importance = None
+
+	def records(self):
+		"""
+		returns the records, whose columns are decoded on first access
+		"""
+		return self.dbf.records()
+
+	def column(self, c):
+		"""
+		returns all values of a single DBF column
+		"""
+		return self.dbf.column(c)
+
+	def select(self, filter):
+		"""
+		returns the indices of the records that pass a layer filter
+		"""
+		import dbfreader
+		return dbfreader.select(self, filter)
+
+	def _view(self, offset, dtype, count):
+		size = {'<i4': 4, '<f8': 8}[dtype]
+		return self.shp[offset:offset + size * count].view(dtype)
+
+	def bbox(self, i):
+		"""
+		returns the lon/lat bounding box of a shape, read from the
+		record header
+		"""
+		off = int(self.offsets[i]) * 2 + 8
+		shapeType = int(self._view(off, '<i4', 1)[0])
+		if shapeType == 0:
+			return [0, 0, 0, 0]
+		if shapeType in (1, 11, 21):
+			x, y = self._view(off + 4, '<f8', 2).tolist()
+			return [x, y, x, y]
+		return self._view(off + 4, '<f8', 4).tolist()
+
+	def shape(self, i):
+		off = int(self.offsets[i]) * 2 + 8 # skip record header
+		shapeType = int(self._view(off, '<i4', 1)[0])
+		if shapeType == 0:
+			return CachedShape(0, self._view(off, '<f8', 0).reshape((0, 2)), [], [])
+		if shapeType in (1, 11, 21):
+			points = self._view(off + 4, '<f8', 2).reshape((1, 2))
+			x, y = points[0]
+			return CachedShape(shapeType, points, [0], [x, y, x, y])
+		bbox = self._view(off + 4, '<f8', 4).tolist()
+		if shapeType in (8, 18, 28):
+			n = int(self._view(off + 36, '<i4', 1)[0])
+			points = self._view(off + 40, '<f8', n * 2).reshape((n, 2))
+			return CachedShape(shapeType, points, [0], bbox)
+		num_parts, n = self._view(off + 36, '<i4', 2).tolist()
+		parts = self._view(off + 44, '<i4', num_parts).tolist()
+		points = self._view(off + 44 + 4 * num_parts, '<f8', n * 2).reshape((n, 2))
+		return CachedShape(shapeType, points, parts, bbox)
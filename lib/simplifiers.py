@@ -0,0 +1,143 @@
+"""
+    kartograph - a svg mapping library
+    Copyright (C) 2011  Gregor Aisch
+
+    This program is free software: you can redistribute it and/or modify
+    it under the terms of the GNU Affero General Public License as
+    published by the Free Software Foundation, either version 3 of the
+    License, or (at your option) any later version.
+
+    This program is distributed in the hope that it will be useful,
+    but WITHOUT ANY WARRANTY; without even the implied warranty of
+    MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+    GNU Affero General Public License for more details.
+
+    You should have received a copy of the GNU Affero General Public License
+    along with this program.  If not, see <http://www.gnu.org/licenses/>.
+"""
+
+"""
+line simplification algorithms
+
+Every simplifier takes an (n,2) array of coordinates and a distance
+and returns a boolean mask of the points to keep. The end points of
+a line are always kept, which preserves the junctions between arcs.
+"""
+
+import numpy as np
+
+
+def radial_distance(coords, dist):
+	"""
+	removes all points closer than dist to the last kept point
+	"""
+	n = len(coords)
+	keep = np.zeros(n, dtype=bool)
+	keep[0] = keep[-1] = True
+	dist_sq = dist * dist
+	pts = coords.tolist()
+	lx, ly = pts[0]
+	for i in range(1, n-1):
+		x, y = pts[i]
+		if (x - lx) * (x - lx) + (y - ly) * (y - ly) > dist_sq:
+			keep[i] = True
+			lx, ly = x, y
+	return keep
+
+
+def douglas_peucker(coords, dist):
+	"""
+	Douglas-Peucker simplification, keeps all points that are further
+	than dist away from the simplified line
+	"""
+	n = len(coords)
+	keep = np.zeros(n, dtype=bool)
+	keep[0] = keep[-1] = True
+	stack = [(0, n-1)]
+	while len(stack) > 0:
+		i, j = stack.pop()
+		if j - i < 2: continue
+		x0, y0 = coords[i]
+		x1, y1 = coords[j]
+		xs = coords[i+1:j,0]
+		ys = coords[i+1:j,1]
+		dx = x1 - x0
+		dy = y1 - y0
+		length = np.hypot(dx, dy)
+		if length > 0:
+			d = np.abs(dy * (xs - x0) - dx * (ys - y0)) / length
+		else:
+			# closed rings start and end at the same point
+			d = np.hypot(xs - x0, ys - y0)
+		k = int(np.argmax(d))
+		if d[k] > dist:
+			k += i + 1
+			keep[k] = True
+			stack.append((i, k))
+			stack.append((k, j))
+	return keep
+
+
+def visvalingam_areas(coords):
+	"""
+	returns the effective area of every point as computed by the
+	Visvalingam-Whyatt algorithm, the end points get an infinite area.
+	the point with the smallest triangle is removed repeatedly, using
+	a heap with lazy deletion of outdated entries
+	"""
+	import heapq
+	n = len(coords)
+	areas = np.empty(n)
+	areas.fill(np.inf)
+	if n < 3:
+		return areas
+	pts = coords.tolist()
+	prev = range(-1, n-1)
+	next = range(1, n+1)
+	current = [0.0] * n
+
+	def triangle(a, b, c):
+		(ax, ay), (bx, by), (cx, cy) = pts[a], pts[b], pts[c]
+		return abs((bx - ax) * (cy - ay) - (cx - ax) * (by - ay)) * .5
+
+	heap = []
+	for i in range(1, n-1):
+		current[i] = triangle(i-1, i, i+1)
+		heap.append((current[i], i))
+	heapq.heapify(heap)
+
+	max_area = 0
+	while len(heap) > 0:
+		area, i = heapq.heappop(heap)
+		if area != current[i] or areas[i] != np.inf:
+			continue # outdated entry
+		# effective areas never decrease, so that points which are
+		# removed later are always considered more important
+		max_area = max(max_area, area)
+		areas[i] = max_area
+		p = prev[i]
+		q = next[i]
+		next[p] = q
+		prev[q] = p
+		if p > 0:
+			current[p] = triangle(prev[p], p, q)
+			heapq.heappush(heap, (current[p], p))
+		if q < n-1:
+			current[q] = triangle(p, q, next[q])
+			heapq.heappush(heap, (current[q], q))
+	return areas
+
+
+def visvalingam(coords, dist):
+	"""
+	Visvalingam-Whyatt simplification, removes all points whose
+	effective triangle area is smaller than dist^2
+	"""
+	return visvalingam_areas(coords) >= dist * dist
+
+
+simplifiers = {
+	'radial': radial_distance,
+	'douglas-peucker': douglas_peucker,
+	'visvalingam': visvalingam
+}
@@ -0,0 +1,84 @@
+"""
+    kartograph - a svg mapping library
+    Copyright (C) 2011  Gregor Aisch
+
+    This program is free software: you can redistribute it and/or modify
+    it under the terms of the GNU Affero General Public License as
+    published by the Free Software Foundation, either version 3 of the
+    License, or (at your option) any later version.
+
+    This program is distributed in the hope that it will be useful,
+    but WITHOUT ANY WARRANTY; without even the implied warranty of
+    MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+    GNU Affero General Public License for more details.
+
+    You should have received a copy of the GNU Affero General Public License
+    along with this program.  If not, see <http://www.gnu.org/licenses/>.
+"""
+
+import math
+
+
+class STRTree(object):
+	"""
+	static R-tree packed with the Sort-Tile-Recursive algorithm
+
+	takes a list of bounding boxes (xmin, ymin, xmax, ymax), the
+	position in that list is the id that is returned by queries
+	"""
+	def __init__(self, bboxes, capacity=16):
+		self.capacity = capacity
+		nodes = []
+		for i in range(len(bboxes)):
+			nodes.append((tuple(bboxes[i]), i))
+		self.leaves = len(nodes)
+		self.levels = []
+		while len(nodes) > capacity:
+			nodes = self._pack(nodes)
+			self.levels.append(nodes)
+		self.root = nodes
+
+	def _pack(self, nodes):
+		"""
+		groups nodes into parent nodes of (at most) capacity children
+		"""
+		M = self.capacity
+		num_parents = int(math.ceil(len(nodes) / float(M)))
+		num_slices = int(math.ceil(math.sqrt(num_parents)))
+		slice_size = num_slices * M
+
+		nodes = sorted(nodes, key=lambda n: n[0][0] + n[0][2])
+		parents = []
+		for s in range(0, len(nodes), slice_size):
+			tile = sorted(nodes[s:s+slice_size], key=lambda n: n[0][1] + n[0][3])
+			for p in range(0, len(tile), M):
+				children = tile[p:p+M]
+				bbox = (
+					min([c[0][0] for c in children]),
+					min([c[0][1] for c in children]),
+					max([c[0][2] for c in children]),
+					max([c[0][3] for c in children])
+				)
+				parents.append((bbox, children))
+		return parents
+
+	def query(self, bbox):
+		"""
+		returns the sorted ids of all boxes intersecting bbox
+		"""
+		xmin, ymin, xmax, ymax = bbox
+		out = []
+		stack = list(self.root)
+		while len(stack) > 0:
+			box, child = stack.pop()
+			if box[0] > xmax or box[2] < xmin or box[1] > ymax or box[3] < ymin:
+				continue
+			if isinstance(child, list):
+				stack += child
+			else:
+				out.append(child)
+		out.sort()
+		return out
+
+	def __len__(self):
+		return self.leaves
@@ -0,0 +1,168 @@
+"""
+    kartograph - a svg mapping library
+    Copyright (C) 2011  Gregor Aisch
+
+    This program is free software: you can redistribute it and/or modify
+    it under the terms of the GNU Affero General Public License as
+    published by the Free Software Foundation, either version 3 of the
+    License, or (at your option) any later version.
+
+    This program is distributed in the hope that it will be useful,
+    but WITHOUT ANY WARRANTY; without even the implied warranty of
+    MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+    GNU Affero General Public License for more details.
+
+    You should have received a copy of the GNU Affero General Public License
+    along with this program.  If not, see <http://www.gnu.org/licenses/>.
+"""
+
+"""
+streaming svg writer
+
+Instead of building the whole document as svgfig tree, the elements are
+written to the output as soon as they are produced. Attribute names may be
+given as keyword arguments, in which case underscores are replaced by
+dashes (as in svgfig), or as dict.
+
+Compressed maps (.svgz) are written through a gzip stream wrapped around
+the output, see open_output().
+"""
+
+from xml.sax.saxutils import escape
+
+SVG_HEADER = '<?xml version="1.0" encoding="utf-8" standalone="no"?>\n' + \
+	'<!DOCTYPE svg PUBLIC "-//W3C//DTD SVG 1.1//EN" "http://www.w3.org/Graphics/SVG/1.1/DTD/svg11.dtd">\n'
+
+
+def to_str(value):
+	if isinstance(value, unicode):
+		return value.encode('utf-8')
+	return str(value)
+
+
+def open_output(out, compress_level=None):
+	"""
+	opens a path or wraps a file-like object for writing a map, which
+	is gzip-compressed if a compression level (1-9) is given. returns
+	the file and whether it must be closed once the map is finished,
+	file-like objects passed in are left open for the caller
+	"""
+	import gzip
+	if hasattr(out, 'write'):
+		if compress_level is None:
+			return (out, False)
+		return (gzip.GzipFile(fileobj=out, mode='wb', compresslevel=compress_level), True)
+	if compress_level is None:
+		return (open(out, 'w'), True)
+	return (gzip.open(out, 'wb', compress_level), True)
+
+
+def open_svg(path):
+	"""
+	opens a svg map for reading, compressed maps are decompressed on the fly
+	"""
+	import gzip
+	f = open(path, 'rb')
+	if f.read(2) == '\x1f\x8b':
+		f.close()
+		return gzip.open(path, 'rb')
+	f.seek(0)
+	return f
+
+
+def format_attributes(attrs):
+	out = []
+	for name in sorted(attrs):
+		out.append(' %s="%s"' % (name, escape(to_str(attrs[name]), { '"': '&quot;' })))
+	return ''.join(out)
+
+
+class SVGWriter(object):
+	"""
+	writes an svg document element by element to a file-like object,
+	path is the location of the output file (if any). close_output
+	tells whether the output is closed once the document is finished
+	"""
+	def __init__(self, out, path=None, close_output=True):
+		self.out = out
+		self.path = path
+		self.close_output = close_output
+		self.stack = []
+
+	def _attrs(self, attrs, kwargs):
+		a = {}
+		if attrs is not None:
+			a.update(attrs)
+		for name in kwargs:
+			a[name.replace('_', '-')] = kwargs[name]
+		return a
+
+	def start_document(self, attrs=None, **kwargs):
+		"""
+		writes the xml header and opens the root svg element
+		"""
+		a = { 'xmlns': 'http://www.w3.org/2000/svg', 'xmlns:xlink': 'http://www.w3.org/1999/xlink', 'version': '1.1' }
+		a.update(self._attrs(attrs, kwargs))
+		self.out.write(SVG_HEADER)
+		self.start('svg', a)
+
+	def continue_document(self, content):
+		"""
+		copies the content of an existing svg document without its closing
+		tag, so that new elements can be appended to it
+		"""
+		end = content.rfind('</svg>')
+		if end < 0:
+			raise ValueError('not a svg document')
+		self.out.write(content[:end])
+		self.stack.append('svg')
+
+	def start(self, tag, attrs=None, **kwargs):
+		"""
+		opens a new element, all following elements become its children
+		until end() is called
+		"""
+		self.out.write('<%s%s>' % (tag, format_attributes(self._attrs(attrs, kwargs))))
+		self.stack.append(tag)
+
+	def end(self):
+		"""
+		closes the element opened last
+		"""
+		self.out.write('</%s>' % self.stack.pop())
+
+	def element(self, tag, text=None, attrs=None, **kwargs):
+		"""
+		writes an element without children
+		"""
+		a = format_attributes(self._attrs(attrs, kwargs))
+		if text is None:
+			self.out.write('<%s%s />' % (tag, a))
+		else:
+			self.out.write('<%s%s>%s</%s>' % (tag, a, escape(to_str(text)), tag))
+
+	def node(self, node):
+		"""
+		writes a svgfig.SVG element including its children
+		"""
+		if len(node.sub) == 0:
+			self.element(node.t, attrs=node.attr)
+			return
+		self.start(node.t, node.attr)
+		for sub in node.sub:
+			if isinstance(sub, basestring):
+				self.out.write(escape(to_str(sub)))
+			else:
+				self.node(sub)
+		self.end()
+
+	def close(self):
+		"""
+		closes all open elements and the output
+		"""
+		while len(self.stack) > 0:
+			self.end()
+		if self.close_output:
+			self.out.close()
+		else:
+			self.out.flush()
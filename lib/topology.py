@@ -0,0 +1,162 @@
+"""
+    kartograph - a svg mapping library
+    Copyright (C) 2011  Gregor Aisch
+
+    This program is free software: you can redistribute it and/or modify
+    it under the terms of the GNU Affero General Public License as
+    published by the Free Software Foundation, either version 3 of the
+    License, or (at your option) any later version.
+
+    This program is distributed in the hope that it will be useful,
+    but WITHOUT ANY WARRANTY; without even the implied warranty of
+    MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+    GNU Affero General Public License for more details.
+
+    You should have received a copy of the GNU Affero General Public License
+    along with this program.  If not, see <http://www.gnu.org/licenses/>.
+"""
+
+"""
+topology-aware simplification
+
+The rings of unified polygons (see gisutils.unify) are split into arcs
+at junctions, i.e. at vertices whose neighbours differ between the rings
+they belong to. Every arc shared by two polygons is stored only once, so
+it is simplified exactly once and both polygons end up with the same
+simplified border. Removed vertices are marked as deleted in the shared
+flag store, which rebuilds the rings from the simplified arcs.
+"""
+
+import numpy as np
+from gisutils import DELETED
+from simplifiers import radial_distance, visvalingam_areas
+
+
+def rings(polygon):
+	"""
+	returns the vertex ids and coordinates of a polygon ring, without
+	the closing duplicate of the first vertex
+	"""
+	vids = polygon.vidx
+	coords = polygon.coords
+	if polygon.closed and len(vids) > 1 and vids[0] == vids[-1]:
+		vids = vids[:-1]
+		coords = coords[:-1]
+	return vids, coords
+
+
+def find_junctions(polygons):
+	"""
+	returns a boolean array over the vertex ids which is true for all
+	vertices where arcs must be split
+	"""
+	if len(polygons) == 0:
+		return np.zeros(0, dtype=bool)
+	num_vertices = len(polygons[0].flags)
+	vertices = []
+	neighbours = []
+	forced = []
+	for polygon in polygons:
+		vids, coords = rings(polygon)
+		if len(vids) == 0: continue
+		prev = np.roll(vids, 1)
+		next = np.roll(vids, -1)
+		if not polygon.closed:
+			# the end points of lines are always junctions
+			prev[0] = next[-1] = -1
+			forced += [vids[0], vids[-1]]
+		vertices.append(vids)
+		neighbours.append(np.column_stack((np.minimum(prev, next), np.maximum(prev, next))))
+	junctions = np.zeros(num_vertices, dtype=bool)
+	if len(vertices) == 0:
+		return junctions
+	vertices = np.concatenate(vertices)
+	neighbours = np.concatenate(neighbours)
+	# count the distinct neighbour pairs of every vertex
+	pairs = np.unique(np.column_stack((vertices, neighbours)), axis=0)
+	junctions = np.bincount(pairs[:,0], minlength=num_vertices) > 1
+	junctions[forced] = True
+	return junctions
+
+
+def split_ring(vids, coords, junctions, closed=True):
+	"""
+	splits a ring at its junctions, returns a list of (vids, coords)
+	"""
+	pos = np.nonzero(junctions[vids])[0]
+	if closed:
+		if len(pos) == 0:
+			# ring without junctions, start at the lowest vertex id so
+			# that every polygon using the ring produces the same arc
+			pos = np.array([np.argmin(vids)])
+		# rotate the ring to start at the first junction and close it
+		start = pos[0]
+		vids = np.concatenate((vids[start:], vids[:start+1]))
+		coords = np.concatenate((coords[start:], coords[:start+1]))
+		pos = np.append(pos - start, len(vids) - 1)
+	else:
+		pos = np.union1d(pos, [0, len(vids) - 1])
+	arcs = []
+	for i in range(len(pos) - 1):
+		arcs.append((vids[pos[i]:pos[i+1]+1], coords[pos[i]:pos[i+1]+1]))
+	return arcs
+
+
+def arc_key(vids):
+	"""
+	returns a key that identifies an arc regardless of its direction.
+	since only the end points of an arc are junctions, an arc is fully
+	determined by its end points and the vertex next to its start
+	"""
+	a = (vids[0], vids[1], vids[-1])
+	b = (vids[-1], vids[-2], vids[0])
+	return min(a, b)
+
+
+def build_arcs(polygons):
+	"""
+	splits the rings of unified polygons into arcs. returns the list of
+	unique arcs as (vids, coords, index of the first polygon using it)
+	"""
+	junctions = find_junctions(polygons)
+	arcs = []
+	known = {}
+	for p in range(len(polygons)):
+		polygon = polygons[p]
+		vids, coords = rings(polygon)
+		if len(vids) < 2: continue
+		for arc_vids, arc_coords in split_ring(vids, coords, junctions, polygon.closed):
+			if len(arc_vids) < 3: continue # nothing to simplify
+			key = (id(polygon.flags),) + arc_key(arc_vids.tolist())
+			if key in known: continue
+			known[key] = len(arcs)
+			arcs.append((arc_vids, arc_coords, p))
+	return arcs
+
+
+def effective_areas(polygons):
+	"""
+	returns the Visvalingam effective area of all vertices of a list of
+	unified polygons, as one array per polygon. the areas are computed
+	once per arc, junctions get an infinite area
+	"""
+	if len(polygons) == 0:
+		return []
+	areas = np.empty(len(polygons[0].flags))
+	areas.fill(np.inf)
+	for vids, coords, p in build_arcs(polygons):
+		areas[vids[1:-1]] = visvalingam_areas(coords)[1:-1]
+	return [areas[polygon.vidx] for polygon in polygons]
+
+
+def simplify(polygons, dists, simplifier=radial_distance):
+	"""
+	simplifies a list of unified polygons. dists holds the simplification
+	distance for every polygon, an arc shared by several polygons is
+	simplified with the distance of the first of them. simplifier is one
+	of the functions in simplifiers
+	"""
+	for vids, coords, p in build_arcs(polygons):
+		keep = simplifier(coords, dists[p])
+		flags = np.frombuffer(polygons[p].flags, dtype=np.uint8)
+		flags[vids[~keep]] |= DELETED
@@ -0,0 +1,53 @@
+"""
+regression tests for clipping polygons to the viewbox
+
+run with: python -m unittest discover tests
+"""
+
+import os, sys, unittest
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), '..', 'lib'))
+
+from gisutils import Polygon, Bounds2D, clip_to_rect
+
+
+def ring_area(polygon):
+	pts = polygon.visible_coords().tolist()
+	s = 0
+	for i in range(len(pts)):
+		x1, y1 = pts[i]
+		x2, y2 = pts[(i+1) % len(pts)]
+		s += x1 * y2 - x2 * y1
+	return abs(s) * .5
+
+
+class ClipToRectTest(unittest.TestCase):
+
+	def setUp(self):
+		self.bbox = Bounds2D(width=100, height=100)
+
+	def test_inside(self):
+		poly = Polygon('a', [(10,10), (50,10), (50,50), (10,50)])
+		self.assertEqual(clip_to_rect(poly, self.bbox), [poly])
+
+	def test_outside(self):
+		poly = Polygon('a', [(110,10), (150,10), (150,50), (110,50)])
+		self.assertEqual(clip_to_rect(poly, self.bbox), [])
+
+	def test_crossing_once(self):
+		poly = Polygon('a', [(50,10), (150,10), (150,50), (50,50)])
+		clipped = clip_to_rect(poly, self.bbox)
+		self.assertEqual(len(clipped), 1)
+		self.assertAlmostEqual(ring_area(clipped[0]), 50 * 40)
+
+	def test_concave_is_split(self):
+		# C-shaped polygon that leaves the box at x=100 and comes back in
+		poly = Polygon('a', [(50,10), (150,10), (150,90), (50,90), (50,70), (120,70), (120,30), (50,30)])
+		clipped = clip_to_rect(poly, self.bbox)
+		self.assertEqual(len(clipped), 2)
+		for piece in clipped:
+			self.assertAlmostEqual(ring_area(piece), 50 * 20)
+			self.assertEqual(piece.id, 'a')
+
+
+if __name__ == '__main__':
+	unittest.main()
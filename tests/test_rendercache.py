@@ -0,0 +1,54 @@
+"""
+tests for the keys of the render cache
+
+run with: python -m unittest discover tests
+"""
+
+import os, sys, shutil, tempfile, unittest
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), '..', 'lib'))
+
+import proj
+from kartograph import Kartograph, KartographOptions
+from test_spatialindex import write_countries
+
+
+class RenderKeyTest(unittest.TestCase):
+
+	def setUp(self):
+		self.tmp = tempfile.mkdtemp()
+		self.data_path = os.path.join(self.tmp, 'data')
+		os.mkdir(self.data_path)
+		write_countries(self.data_path)
+		self.cache = os.path.join(self.tmp, 'cache')
+
+	def tearDown(self):
+		shutil.rmtree(self.tmp)
+
+	def kartograph(self):
+		options = KartographOptions()
+		options.data_path = self.data_path + '/'
+		options.projection = proj.projections['robinson']
+		options.render_cache = self.cache
+		options.applyDefaults('country')
+		K = Kartograph(options)
+		# the fixture has no regions and lakes
+		K.shp_src = { 'countries': K.shp_src['countries'] }
+		return K
+
+	def render(self, K, iso3):
+		K.render_country(iso3, outfile=os.path.join(self.tmp, iso3 + '.svg'))
+
+	def test_key_independent_of_render_order(self):
+		K = self.kartograph()
+		self.render(K, 'DEU')
+		self.render(K, 'DEU')
+		self.render(K, 'AUS')
+		self.assertEqual(len(os.listdir(self.cache)), 2)
+		# AUS rendered alone must find the map rendered after DEU
+		self.render(self.kartograph(), 'AUS')
+		self.render(self.kartograph(), 'DEU')
+		self.assertEqual(len(os.listdir(self.cache)), 2)
+
+
+if __name__ == '__main__':
+	unittest.main()
@@ -0,0 +1,100 @@
+"""
+regression tests for the pre-selection of the shapes visible in a view
+
+run with: python -m unittest discover tests
+"""
+
+import os, sys, shutil, tempfile, unittest
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), '..', 'lib'))
+
+import shapefile
+import proj
+from cStringIO import StringIO
+from kartograph import Kartograph, KartographOptions
+
+
+# 3x3 grid of countries around DEU, and one far away
+GRID = [['ESP', 'CHE', 'AUT'], ['FRA', 'DEU', 'POL'], ['GBR', 'DNK', 'LTU']]
+NEIGHBOURS = set(['ESP', 'CHE', 'AUT', 'FRA', 'POL', 'GBR', 'DNK', 'LTU'])
+
+
+def rect(x0, y0, x1, y1, n=10):
+	pts = []
+	for i in range(n): pts.append([x0 + (x1-x0) * i / float(n), y0])
+	for i in range(n): pts.append([x1, y0 + (y1-y0) * i / float(n)])
+	for i in range(n): pts.append([x1 - (x1-x0) * i / float(n), y1])
+	for i in range(n): pts.append([x0, y1 - (y1-y0) * i / float(n)])
+	pts.append(pts[0])
+	return pts
+
+
+def write_countries(data_path):
+	os.mkdir(os.path.join(data_path, 'shp'))
+	w = shapefile.Writer(shapefile.POLYGON)
+	for i in range(31):
+		w.field('F%d' % i, 'C', 20)
+	countries = []
+	for row in range(3):
+		for col in range(3):
+			# the neighbours overlap DEU a little, so all of them are visible
+			countries.append((GRID[row][col], rect(col * 9, 41 + row * 6, 11 + col * 9, 49 + row * 6)))
+	countries.append(('AUS', rect(115, -40, 150, -12)))
+	for iso3, ring in countries:
+		w.poly(parts=[ring])
+		rec = [''] * 31
+		rec[29] = iso3
+		w.record(*rec)
+	w.save(os.path.join(data_path, 'shp', 'ne_10m_admin_0_countries'))
+	open(os.path.join(data_path, 'countryInfo.txt'), 'w').close()
+
+
+class RecordingKartograph(Kartograph):
+	"""
+	remembers the countries of the last rendered map
+	"""
+	def get_polygons_country_context(self, *args, **kwargs):
+		polygons = Kartograph.get_polygons_country_context(self, *args, **kwargs)
+		self.rendered = set([p.id for p in polygons])
+		return polygons
+
+	def get_polygons_countries(self, *args, **kwargs):
+		polygons = Kartograph.get_polygons_countries(self, *args, **kwargs)
+		self.rendered = set([p.id for p in polygons])
+		return polygons
+
+
+class ViewCandidatesTest(unittest.TestCase):
+
+	@classmethod
+	def setUpClass(cls):
+		cls.data_path = tempfile.mkdtemp()
+		write_countries(cls.data_path)
+
+	@classmethod
+	def tearDownClass(cls):
+		shutil.rmtree(cls.data_path)
+
+	def kartograph(self, projection):
+		options = KartographOptions()
+		options.data_path = self.data_path + '/'
+		options.projection = proj.projections[projection]
+		options.add_context = True
+		options.applyDefaults('country')
+		return RecordingKartograph(options)
+
+	def test_context_neighbours(self):
+		for projection in ('robinson', 'mercator', 'naturalearth', 'laea'):
+			K = self.kartograph(projection)
+			K.render_country_and_context('DEU', outfile=StringIO())
+			self.assertEqual(K.rendered, NEIGHBOURS | set(['DEU']), projection)
+
+	def test_countries_neighbours(self):
+		for projection in ('robinson', 'mercator', 'laea'):
+			K = self.kartograph(projection)
+			K.render_countries(['DEU', 'POL'], outfile=StringIO())
+			self.assertTrue(set(['DEU', 'POL', 'AUT', 'LTU']) <= K.rendered, projection)
+			self.assertTrue('AUS' not in K.rendered, projection)
+
+
+if __name__ == '__main__':
+	unittest.main()